@@ -1,26 +1,35 @@
-from llm import *
-from util.request import get_arxiv_papers_from_date
+from llm import load_model
+from util.request import get_arxiv_papers_from_date, polite_sleep
+from util.usage import UsageTracker
+from util.metrics import metrics
+from util.profiling import profiler
+from util.cassette import cassette
+from util.paper import Paper
+from util.delivery import delivery
+from util.history import history
+from util import dedup
+from util.ratelimit import llm_limiter, rate_limits
 from util.construct_email import (
     framework,
     get_block_html,
     get_empty_html,
     get_stars,
     get_summary_html,
+    render_html,
 )
-from tqdm import tqdm
 import json
 import os
 from datetime import datetime
 import time
 import random
-import smtplib
 from email.mime.text import MIMEText
 from email.header import Header
 from email.utils import parseaddr, formataddr
 from concurrent.futures import ThreadPoolExecutor, as_completed
 import threading
+import heapq
+from dataclasses import replace
 from loguru import logger
-from datetime import timedelta
 
 
 class ArxivDaily:
@@ -38,6 +47,11 @@ class ArxivDaily:
         temperature: float,
         save_dir: None,
         server_chan_key: str = "",
+        user: str = "",
+        prices: dict = None,
+        email_max_bytes: int = None,
+        dedup_threshold: float = 0.8,
+        seen: dict = None,
     ):
         self.model_name = model
         self.base_url = base_url
@@ -47,9 +61,40 @@ class ArxivDaily:
         self.num_workers = num_workers
         self.temperature = temperature
         self.server_chan_key = server_chan_key
+        self.user = user
+        self.email_max_bytes = email_max_bytes
+        if email_max_bytes and not save_dir:
+            # 没有保存目录就无法归档完整的日报，超出预算的论文会被直接丢弃，因此不启用预算
+            logger.warning(
+                f"email_max_bytes={email_max_bytes} is ignored because 'save' is off: papers over the budget "
+                "could not be archived. Enable 'save' to cap the email size."
+            )
+            self.email_max_bytes = None
+        # 标题+摘要的 MinHash 相似度达到该阈值时复用已有的打分结果
+        self.dedup_threshold = dedup_threshold
+        self.provider = provider.lower()
+        self.rate_limit = llm_limiter(provider, base_url)
         self.papers = {}
+        if save_dir and not history.enabled:
+            history.open(os.path.join(save_dir, "history.sqlite3"))
+        # arXiv ID -> Paper，跨类别共享，交叉列表的论文只抓取一次；
+        # 常驻模式下由调用方传入，在多次运行之间保留，已抓取过摘要的论文不再请求
+        shared = seen is not None
+        if seen is None:
+            seen = {}
+        copies = {}
         for category in categories:
-            self.papers[category] = get_arxiv_papers_from_date(category, max_entries, days="pastweek")
+            with metrics.timer("fetch_category", user=user, provider=self.provider, category=category), profiler.stage("fetch"):
+                self.papers[category] = get_arxiv_papers_from_date(
+                    category, max_entries, days="pastweek", seen=seen, labels={"user": user, "provider": self.provider}
+                )
+            if shared:
+                # 打分结果写在 Paper 上，共享缓存中的对象需要复制一份，避免影响其他用户
+                self.papers[category] = [
+                    copies.setdefault(paper.arxiv_id, replace(paper)) for paper in self.papers[category]
+                ]
+            metrics.inc("papers_fetched_total", len(self.papers[category]), user=user, category=category)
+            history.add_papers(self.papers[category])
             print(
                 "{} papers on arXiv for {} are fetched.".format(
                     len(self.papers[category]), category
@@ -57,15 +102,10 @@ class ArxivDaily:
             )
             # avoid being blocked
             sleep_time = random.randint(5, 15)
-            time.sleep(sleep_time)
+            polite_sleep(sleep_time)
 
-        provider = provider.lower()
-        if provider == "ollama":
-            self.model = Ollama(model)
-        elif provider == "openai" or provider == "siliconflow":
-            self.model = GPT(model, base_url, api_key)
-        else:
-            assert False, "Model not supported."
+        provider = self.provider
+        self.model = load_model(provider, model, base_url, api_key)
         print(
             "Model initialized successfully. Using {} provided by {}.".format(
                 model, provider
@@ -74,8 +114,38 @@ class ArxivDaily:
 
         self.description = description
         self.lock = threading.Lock()  # 添加线程锁
+        self.usage = UsageTracker(user, model, prices)
+
+    def inference(self, prompt, stage, category=""):
+        start = time.perf_counter()
+        waited = 0.0
+
+        def call():
+            nonlocal waited
+            # 同一 LLM 端点的限速器由所有用户共享，等待时间不计入推理延迟
+            waited = rate_limits.acquire(self.rate_limit)
+            return self.model.inference_with_usage(prompt, temperature=self.temperature)
+
+        try:
+            response, usage = cassette.llm(self.model_name, self.temperature, prompt, call)
+        except Exception:
+            metrics.inc("llm_errors_total", user=self.user, provider=self.provider, stage=stage)
+            raise
+        latency = time.perf_counter() - start - waited
+        metrics.observe(
+            "llm_inference_seconds", latency, user=self.user, provider=self.provider, stage=stage
+        )
+        self.usage.record(
+            stage,
+            usage["prompt_tokens"],
+            usage["completion_tokens"],
+            latency,
+            retries=usage["retries"],
+            category=category,
+        )
+        return response
 
-    def get_response(self, title, abstract):
+    def get_response(self, title, abstract, category=""):
         prompt = """
             你是一个有帮助的 AI 研究助手，可以帮助我构建论文推荐系统。
             以下是我最近研究领域的描述：
@@ -100,57 +170,139 @@ class ArxivDaily:
             直接返回上述 JSON 格式，无需任何额外解释。
         """
 
-        response = self.model.inference(prompt, temperature=self.temperature)
+        response = self.inference(prompt, "score", category)
         return response
 
-    def process_paper(self, paper, max_retries=5):
+    def process_paper(self, paper: Paper, max_retries=5):
+        with profiler.stage("infer"):
+            return self._process_paper(paper, max_retries)
+
+    def _process_paper(self, paper: Paper, max_retries=5):
         retry_count = 0
 
         while retry_count < max_retries:
             try:
-                title = paper["title"]
-                abstract = paper["abstract"]
-                response = self.get_response(title, abstract)
+                response = self.get_response(paper.title, paper.abstract, paper.category)
                 response = response.strip("```").strip("json")
                 response = json.loads(response)
                 abstract_cn = response["abstract"]
                 relevance_score = float(response["relevance"])
                 summary = response["summary"]
                 with self.lock:
-                    return {
-                        "title": title,
-                        "arXiv_id": paper["arXiv_id"],
-                        "abstract": abstract,
-                        "abstract_cn": abstract_cn,
-                        "summary": summary,
-                        "relevance_score": relevance_score,
-                        "pdf_url": paper["pdf_url"],
-                    }
+                    paper.abstract_cn = abstract_cn
+                    paper.summary = summary
+                    paper.relevance_score = relevance_score
+                    return paper
             except Exception as e:
+                if isinstance(e, (json.JSONDecodeError, KeyError, TypeError, ValueError)):
+                    metrics.inc("json_parse_failures_total", user=self.user, provider=self.provider)
                 retry_count += 1
-                print(f"处理论文 {paper['arXiv_id']} 时发生错误: {e}")
+                print(f"处理论文 {paper.arxiv_id} 时发生错误: {e}")
                 print(f"正在进行第 {retry_count} 次重试...")
                 if retry_count == max_retries:
                     print(f"已达到最大重试次数 {max_retries}，放弃处理该论文")
                     return None
                 time.sleep(1)  # 重试前等待1秒
 
+    def _deduplicate(self, papers):
+        """
+        Reuse earlier LLM results for papers that were already scored for this user, model and
+        description: the same arXiv ID (re-listed or revised) or an LSH candidate, as long as the
+        title + abstract is at least dedup_threshold similar to what was scored. Near-identical papers
+        within this run are kept once.
+
+        Returns (papers that still need the LLM, {arxiv_id: signature}, IDs of in-run duplicates).
+        """
+        signatures = {paper.arxiv_id: dedup.paper_signature(paper) for paper in papers}
+        candidates, stored, cached = {}, {}, {}
+        # 回放时不复用历史库中的结果，否则打分请求全部被跳过，回放无法重现录制时的推理过程
+        if history.enabled and not cassette.replaying:
+            candidates = history.lsh_candidates(signatures)
+            ids = set(signatures).union(*candidates.values())
+            stored = history.signatures(ids)
+            cached = history.cached_results(self.user, self.model_name, self.description, ids)
+
+        reused = {"relisted": 0, "revised": 0, "near_duplicate": 0}
+        pending, duplicates = [], []
+        index = dedup.LSHIndex()
+        for paper in papers:
+            signature = signatures[paper.arxiv_id]
+            if index.query(signature, self.dedup_threshold) is not None:
+                duplicates.append(paper.arxiv_id)
+                continue
+            index.add(paper.arxiv_id, signature)
+
+            best, best_score = None, self.dedup_threshold
+            for source in (paper.arxiv_id, *candidates.get(paper.arxiv_id, ())):
+                if source in cached and source in stored:
+                    score = dedup.similarity(signature, stored[source])
+                    if score >= best_score:
+                        best, best_score = source, score
+            if best is None:
+                pending.append(paper)
+                continue
+
+            result = cached[best]
+            paper.abstract_cn = result["abstract_cn"]
+            paper.summary = result["summary"]
+            paper.relevance_score = result["relevance_score"]
+            if best != paper.arxiv_id:
+                reused["near_duplicate"] += 1
+            elif best_score == 1:
+                reused["relisted"] += 1
+            else:
+                reused["revised"] += 1
+
+        for reason, count in reused.items():
+            if count:
+                metrics.inc("llm_calls_avoided_total", count, user=self.user, provider=self.provider, reason=reason)
+        if duplicates:
+            metrics.inc(
+                "llm_calls_avoided_total", len(duplicates), user=self.user, provider=self.provider, reason="duplicate"
+            )
+        logger.info(
+            f"Dedup: reused cached results for {reused['relisted']} re-listed, {reused['revised']} revised and "
+            f"{reused['near_duplicate']} near-duplicate papers, skipped {len(duplicates)} duplicates in this run; "
+            f"{sum(reused.values()) + len(duplicates)} LLM calls avoided, {len(pending)} papers to score."
+        )
+        return pending, signatures, duplicates
+
     def get_recommendation(self):
+        from tqdm import tqdm
+
         recommendations = {}
         for category, papers in self.papers.items():
             for paper in papers:
-                recommendations[paper["arXiv_id"]] = paper
+                recommendations[paper.arxiv_id] = paper
 
         print(
             f"Got {len(recommendations)} non-overlapping papers from the past week's arXiv."
         )
 
-        recommendations_ = []
-        print("Performing LLM inference...")
+        pending, signatures, duplicates = self._deduplicate(list(recommendations.values()))
+        for paper_id in duplicates:
+            del recommendations[paper_id]
+
+        # 只保留得分最高的 max_paper_num 篇论文：小顶堆，堆顶为当前最低分
+        # 同分时按 arXiv ID 排序（较新的在前），与线程完成顺序无关，回放时生成的总结 prompt 与录制时一致
+        top = []
 
+        def push(paper):
+            item = (paper.relevance_score, paper.arxiv_id, paper)
+            if len(top) < self.max_paper_num:
+                heapq.heappush(top, item)
+            else:
+                heapq.heappushpop(top, item)
+
+        for paper in recommendations.values():
+            if paper.relevance_score is not None:
+                push(paper)
+
+        print("Performing LLM inference...")
+        scored = {}
         with ThreadPoolExecutor(self.num_workers) as executor:
             futures = []
-            for arXiv_id, paper in recommendations.items():
+            for paper in pending:
                 futures.append(executor.submit(self.process_paper, paper))
             for future in tqdm(
                 as_completed(futures),
@@ -160,43 +312,26 @@ class ArxivDaily:
             ):
                 result = future.result()
                 if result:
-                    recommendations_.append(result)
+                    scored[result.arxiv_id] = signatures[result.arxiv_id]
+                    push(result)
 
-        recommendations_ = sorted(
-            recommendations_, key=lambda x: x["relevance_score"], reverse=True
-        )[: self.max_paper_num]
+        recommendations_ = [paper for _, _, paper in sorted(top, reverse=True)]
 
-        # Save recommendation to markdown file
-        current_time = datetime.now()
-        save_path = os.path.join(
-            self.save_dir, f"{current_time.strftime('%Y-%m-%d')}.md"
-        )
-        # Create the directory if it doesn't exist
-        os.makedirs(self.save_dir, exist_ok=True)
-
-        with open(save_path, "w", encoding="utf-8") as f:
-            f.write("# Weekly arXiv Papers\n")
-            # 计算周报起始时间：以当前时间为基准向前推7天，用于生成周报日期范围
-            start_time = current_time - timedelta(days=7)
-            f.write(f"## Date: {start_time.strftime('%Y-%m-%d')} - {current_time.strftime('%Y-%m-%d')}\n")
-            f.write(f"## Description: {self.description}\n")
-            f.write("## Papers:\n")
-            for i, paper in enumerate(recommendations_):
-                f.write(f"### {i + 1}. {paper['title']}\n")
-                f.write(f"#### Abstract:\n")
-                f.write(f"{paper['abstract_cn']}\n")
-                f.write(f"#### Summary:\n")
-                f.write(f"{paper['summary']}\n")
-                f.write(f"#### Relevance Score: {paper['relevance_score']}\n")
-                f.write(f"#### PDF URL: {paper['pdf_url']}\n")
-                f.write("\n")
+        # 所有打分结果写入历史库，markdown 归档由历史库生成
+        history.record_results(self.user, recommendations.values(), recommendations_, model=self.model_name)
+        history.add_signatures(scored)
+        history.record_run(self.user, description=self.description)
+        if self.save_dir and history.enabled:
+            save_path = os.path.join(self.save_dir, f"{datetime.now().strftime('%Y-%m-%d')}.md")
+            with open(save_path, "w", encoding="utf-8") as f:
+                f.write(history.markdown(self.user))
 
         return recommendations_
 
     def summarize(self, recommendations):
         overview = ""
         for i in range(len(recommendations)):
-            overview += f"{i + 1}. {recommendations[i]['title']} - {recommendations[i]['summary']} \n"
+            overview += f"{i + 1}. {recommendations[i].title} - {recommendations[i].summary} \n"
         prompt = """
             你是一个有帮助的 AI 研究助手，可以帮助我构建论文推荐系统。
             以下是我最近研究领域的描述：
@@ -254,46 +389,63 @@ class ArxivDaily:
             直接返回HTML内容,无需其他说明。
         """
 
-        response = (
-            self.model.inference(prompt, temperature=self.temperature)
-            .strip("```")
-            .strip("html")
-            .strip()
-        )
+        with metrics.timer("summarize", user=self.user, provider=self.provider), profiler.stage("infer"):
+            response = (
+                self.inference(prompt, "summarize")
+                .strip("```")
+                .strip("html")
+                .strip()
+            )
         print(response)
         response = get_summary_html(response)
         return response
 
     def render_email(self, recommendations):
-        parts = []
+        """
+        Render the digest. When email_max_bytes is set (only honoured together with save_dir), papers
+        that do not fit are left out of the email and the complete digest is written to
+        <date>-<user>-full.html in save_dir.
+        """
+        from tqdm import tqdm
+
         if len(recommendations) == 0:
             return framework.replace("__CONTENT__", get_empty_html())
-        for i, p in enumerate(tqdm(recommendations, desc="Rendering Emails")):
-            rate = get_stars(p["relevance_score"])
-            parts.append(
-                get_block_html(
-                    str(i + 1) + ". " + p["title"],
-                    rate,
-                    p["arXiv_id"],
-                    p["summary"],
-                    p["pdf_url"],
-                )
+        blocks = [
+            get_block_html(
+                str(i + 1) + ". " + p.title,
+                get_stars(p.relevance_score),
+                p.arxiv_id,
+                p.summary,
+                p.pdf_url,
             )
-        summary = self.summarize(recommendations)
+            for i, p in enumerate(tqdm(recommendations, desc="Rendering Emails"))
+        ]
         # Add the summary to the start of the email
-        content = summary
-        content += "<br>" + "</br><br>".join(parts) + "</br>"
-        return framework.replace("__CONTENT__", content)
-
-    def _send_to_server_chan(self, title, desp):
+        summary = self.summarize(recommendations)
+        history.record_run(self.user, summary_html=summary)
+
+        archive = f"{datetime.now().strftime('%Y-%m-%d')}-{self.user or 'email'}-full.html"
+        html, included = render_html(summary, blocks, self.email_max_bytes, archive)
+        if included < len(blocks):
+            metrics.inc("email_papers_truncated_total", len(blocks) - included, user=self.user)
+            logger.warning(
+                f"Email exceeds {self.email_max_bytes} bytes, only {included}/{len(blocks)} papers are included."
+            )
+            archive_path = os.path.join(self.save_dir, archive)
+            full_html, _ = render_html(summary, blocks)
+            with open(archive_path, "w", encoding="utf-8") as f:
+                f.write(full_html)
+            logger.info(f"Full digest saved to {archive_path}")
+        return html
+
+    def _send_to_server_chan(self, title, desp, queue_failures=True):
         """
-        使用Server酱发送通知，支持多个KEY
+        使用Server酱发送通知，支持多个KEY（并发发送，失败的通知进入重发队列）
         title: 通知标题
         desp: 通知内容
+        queue_failures: 发送失败时是否进入重发队列（发送成功的确认通知过期即无意义，不重发）
         """
         try:
-            import requests
-
             # Use the key from the constructor
             server_chan_key_str = self.server_chan_key
             Server_chan_KEY = server_chan_key_str.split(',')
@@ -303,23 +455,7 @@ class ArxivDaily:
                 print("未配置Server酱KEY,跳过通知发送")
                 return False
 
-            success_count = 0
-            for key in Server_chan_KEY:
-                try:
-                    # Server酱通知接口
-                    server_url = f"https://sctapi.ftqq.com/{key}.send"
-                    # 构造请求数据
-                    data = {"title": title, "desp": desp}
-                    # 发送POST请求
-                    response = requests.post(server_url, data=data)
-                    if response.status_code == 200:
-                        print(f"Server酱通知发送成功 (KEY: {key[:4]}...)")
-                        success_count += 1
-                    else:
-                        print(f"Server酱通知发送失败,状态码:{response.status_code} (KEY: {key[:4]}...)")
-                except Exception as e:
-                    print(f"使用KEY {key[:4]}...发送通知时出错: {str(e)}")
-            return success_count > 0
+            return delivery.notify(Server_chan_KEY, title, desp, queue_failures)
         except Exception as e:
             print(f"发送Server酱通知时出错:{str(e)}")
             return False
@@ -334,7 +470,14 @@ class ArxivDaily:
         title: str,
     ):
         recommendations = self.get_recommendation()
-        html = self.render_email(recommendations)
+        with metrics.timer("render", user=self.user, provider=self.provider), profiler.stage("render"):
+            html = self.render_email(recommendations)
+        html_bytes = len(html.encode("utf-8"))
+        metrics.inc("email_bytes_total", html_bytes, user=self.user)
+        logger.info(f"Rendered email: {html_bytes} bytes, {len(recommendations)} papers.")
+        if self.save_dir:
+            usage_path = self.usage.save(self.save_dir, datetime.now().strftime("%Y-%m-%d"))
+            logger.info(f"LLM usage summary saved to {usage_path}")
 
         def _format_addr(s):
             name, addr = parseaddr(s)
@@ -354,24 +497,40 @@ class ArxivDaily:
         today = datetime.now().strftime("%Y/%m/%d")
         msg["Subject"] = Header(f"{title} {today}", "utf-8").encode()
 
-        try:
-            server = smtplib.SMTP(smtp_server, smtp_port)
-            server.starttls()
-        except Exception as e:
-            logger.warning(f"Failed to use TLS. {e}")
-            logger.warning(f"Try to use SSL.")
-            server = smtplib.SMTP_SSL(smtp_server, smtp_port)
+        if cassette.replaying:
+            # 回放模式下不访问网络，邮件内容保存为本地 HTML 文件
+            if self.save_dir:
+                html_path = os.path.join(
+                    self.save_dir, f"{datetime.now().strftime('%Y-%m-%d')}-{self.user or 'email'}.html"
+                )
+                with open(html_path, "w", encoding="utf-8") as f:
+                    f.write(html)
+                logger.info(f"Replay mode: email not sent, saved to {html_path}")
+            else:
+                logger.info("Replay mode: email not sent.")
+            return
 
         try:
-            server.login(sender, password)
-            server.sendmail(sender, receivers, msg.as_string())
-            server.quit()
+            with metrics.timer("send", user=self.user, provider=self.provider), profiler.stage("send"):
+                delivery.send_mail(sender, password, smtp_server, smtp_port, receivers, msg.as_string())
+            metrics.inc("emails_sent_total", user=self.user)
             logger.info("Email sent successfully!")
-            self._send_to_server_chan(f"{today}邮件发送成功", f"已成功发送邮件至: {', '.join(receivers)}")
+            self._send_to_server_chan(
+                f"{today}邮件发送成功", f"已成功发送邮件至: {', '.join(receivers)}", queue_failures=False
+            )
         except Exception as e:
             logger.error(f"Failed to send email: {e}")
+            delivery.enqueue(
+                "email",
+                {
+                    "sender": sender,
+                    "receivers": receivers,
+                    "smtp_server": smtp_server,
+                    "smtp_port": smtp_port,
+                    "message": msg.as_string(),
+                },
+            )
             logger.info("Falling back to ServerChan.")
-            print(msg.as_string())
             self._send_to_server_chan(f"{title} {today}", msg.as_string())
 
 
@@ -0,0 +1,138 @@
+"""
+A local stand-in for arxiv.org serving synthetic listing and abstract pages.
+
+The markup mirrors the parts of the real pages that util/request.py reads:
+  /list/<category>/pastweek?skip=&show=   <dl id="articles"> with <dt>/<dd> pairs
+  /list/<category>/new?skip=&show=        same, with the abstract inline in <p class="mathjax">
+  /abs/<arxiv_id>                         <blockquote class="abstract mathjax">
+"""
+
+import random
+import threading
+from html import escape
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+WORDS = (
+    "diffusion transformer detection multimodal language model vision robust efficient "
+    "quantum atom interferometry laser cooling graph agent reinforcement learning sparse "
+    "attention segmentation benchmark scaling self-supervised retrieval reasoning"
+).split()
+
+
+def make_text(rng: random.Random, n_words: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(n_words))
+
+
+class SyntheticArxiv:
+    """Deterministic synthetic papers: `papers` per category, seeded by category name."""
+
+    def __init__(self, papers: int = 1000, abstract_words: int = 180, seed: int = 0):
+        self.papers = papers
+        self.abstract_words = abstract_words
+        self.seed = seed
+        self._cache = {}
+        self.lock = threading.Lock()
+
+    def listing(self, category: str) -> list:
+        with self.lock:
+            if category not in self._cache:
+                rng = random.Random(f"{self.seed}-{category}")
+                prefix = 2500 + sum(map(ord, category)) % 100
+                self._cache[category] = [
+                    {
+                        "arxiv_id": f"{prefix}.{i:05d}",
+                        "title": make_text(rng, 10).capitalize(),
+                        "comments": f"{rng.randint(5, 40)} pages, {rng.randint(1, 12)} figures",
+                        "abstract": make_text(rng, self.abstract_words).capitalize() + ".",
+                    }
+                    for i in range(self.papers)
+                ]
+                # 交叉列表：前 10% 的论文在所有类别中使用相同的 ID
+                for paper in self._cache[category][: self.papers // 10]:
+                    paper["arxiv_id"] = "2500." + paper["arxiv_id"].split(".")[1]
+            return self._cache[category]
+
+    def abstract(self, arxiv_id: str) -> str:
+        rng = random.Random(f"{self.seed}-abs-{arxiv_id}")
+        return make_text(rng, self.abstract_words).capitalize() + "."
+
+    def render_listing(self, category: str, skip: int, show: int, inline_abstract: bool) -> str:
+        parts = [
+            "<!DOCTYPE html><html><head><title>arXiv listing</title></head><body>",
+            f"<div id='dlpage'><h1>{escape(category)}</h1>",
+            '<dl id="articles">',
+        ]
+        for paper in self.listing(category)[skip : skip + show]:
+            arxiv_id = paper["arxiv_id"]
+            parts.append(
+                "<dt>"
+                f'<a name="item{arxiv_id}"></a>'
+                f'<a href="/abs/{arxiv_id}" title="Abstract" id="{arxiv_id}">arXiv:{arxiv_id}</a> '
+                f'[<a href="/pdf/{arxiv_id}" title="Download PDF" id="pdf-{arxiv_id}">pdf</a>, '
+                f'<a href="/html/{arxiv_id}v1" title="View HTML">html</a>]'
+                "</dt>"
+            )
+            dd = [
+                '<dd><div class="meta">',
+                f'<div class="list-title mathjax"><span class="descriptor">Title:</span> {escape(paper["title"])}</div>',
+                '<div class="list-authors"><a href="#">A. Author</a>, <a href="#">B. Author</a></div>',
+                f'<div class="list-comments mathjax"><span class="descriptor">Comments:</span> {paper["comments"]}</div>',
+                f'<div class="list-subjects"><span class="primary-subject">{escape(category)}</span></div>',
+            ]
+            if inline_abstract:
+                dd.append(f'<p class="mathjax">{escape(paper["abstract"])}</p>')
+            dd.append("</div></dd>")
+            parts.append("".join(dd))
+        parts.append("</dl></div></body></html>")
+        return "\n".join(parts)
+
+    def render_abstract(self, arxiv_id: str) -> str:
+        return (
+            "<!DOCTYPE html><html><head><title>arXiv abs</title></head><body>"
+            f'<div id="abs"><h1 class="title mathjax">Paper {escape(arxiv_id)}</h1>'
+            '<blockquote class="abstract mathjax">'
+            f'<span class="descriptor">Abstract:</span>{escape(self.abstract(arxiv_id))}'
+            "</blockquote></div></body></html>"
+        )
+
+
+class _Handler(BaseHTTPRequestHandler):
+    site: SyntheticArxiv = None
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        parts = url.path.strip("/").split("/")
+        if len(parts) == 3 and parts[0] == "list" and parts[2] in ("pastweek", "new"):
+            skip = int(query.get("skip", ["0"])[0])
+            show = int(query.get("show", ["25"])[0])
+            body = self.site.render_listing(parts[1], skip, show, inline_abstract=parts[2] == "new")
+        elif len(parts) == 2 and parts[0] == "abs":
+            body = self.site.render_abstract(parts[1])
+        else:
+            self.send_error(404)
+            return
+        data = body.encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class _Server(ThreadingHTTPServer):
+    # 默认的 listen backlog 为 5，并发 worker 较多时会丢 SYN 并引入 1 秒的重传延迟
+    request_queue_size = 128
+
+
+def start_server(site: SyntheticArxiv, host: str = "127.0.0.1", port: int = 0):
+    """Serve `site` from a daemon thread; returns (server, base_url)."""
+    handler = type("Handler", (_Handler,), {"site": site})
+    server = _Server((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
@@ -0,0 +1,147 @@
+"""
+A local stand-in for an OpenAI-compatible (/v1/chat/completions) or Ollama (/api/generate) server.
+
+Latency is drawn from a configurable distribution and a fraction of requests fail with
+HTTP 500, so that retry paths and tail latency can be exercised without a paid API.
+"""
+
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+SUMMARY_HTML = """<h2>总体概述</h2>
+<p>Synthetic overview of {n} papers.</p>
+<h2>总体趋势</h2>
+<ol><li>Synthetic trend.</li></ol>
+"""
+
+
+class FakeModel:
+    """
+    latency: "constant", "uniform" or "lognormal"; `mean` seconds, `jitter` spread.
+    error_rate: probability of an HTTP 500 per request.
+    """
+
+    def __init__(
+        self,
+        latency: str = "lognormal",
+        mean: float = 0.05,
+        jitter: float = 0.5,
+        error_rate: float = 0.0,
+        seed: int = 0,
+    ):
+        self.latency = latency
+        self.mean = mean
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+
+    def draw(self):
+        """Return (delay in seconds, whether the request fails, relevance score to answer with)."""
+        with self.lock:
+            if self.latency == "constant":
+                delay = self.mean
+            elif self.latency == "uniform":
+                delay = self.rng.uniform(self.mean * (1 - self.jitter), self.mean * (1 + self.jitter))
+            else:
+                delay = self.mean * self.rng.lognormvariate(0, self.jitter)
+            fail = self.rng.random() < self.error_rate
+            score = self.rng.uniform(0, 10)
+        return max(delay, 0.0), fail, score
+
+    def answer(self, prompt: str, score: float) -> str:
+        if "relevance" in prompt:
+            return json.dumps(
+                {
+                    "abstract": "合成的中文摘要。",
+                    "summary": "合成的论文总结。",
+                    "relevance": round(score, 1),
+                },
+                ensure_ascii=False,
+            )
+        return SUMMARY_HTML.format(n=prompt.count(" - "))
+
+
+class _Handler(BaseHTTPRequestHandler):
+    model: FakeModel = None
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+        delay, fail, score = self.model.draw()
+        time.sleep(delay)
+        if fail:
+            self._reply(500, {"error": {"message": "synthetic failure"}})
+            return
+
+        if self.path.endswith("/chat/completions"):
+            content = request["messages"][-1]["content"]
+            if isinstance(content, list):
+                content = "".join(part.get("text", "") for part in content)
+            text = self.model.answer(content, score)
+            prompt_tokens, completion_tokens = len(content) // 4, len(text) // 4
+            self._reply(
+                200,
+                {
+                    "id": "chatcmpl-fake",
+                    "object": "chat.completion",
+                    "created": int(time.time()),
+                    "model": request.get("model", "fake"),
+                    "choices": [
+                        {
+                            "index": 0,
+                            "message": {"role": "assistant", "content": text},
+                            "finish_reason": "stop",
+                        }
+                    ],
+                    "usage": {
+                        "prompt_tokens": prompt_tokens,
+                        "completion_tokens": completion_tokens,
+                        "total_tokens": prompt_tokens + completion_tokens,
+                    },
+                },
+            )
+        elif self.path == "/api/generate":
+            prompt = request.get("prompt", "")
+            text = "<think>synthetic</think>" + self.model.answer(prompt, score)
+            self._reply(
+                200,
+                {
+                    "model": request.get("model", "fake"),
+                    "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ"),
+                    "response": text,
+                    "done": True,
+                    "prompt_eval_count": len(prompt) // 4,
+                    "eval_count": len(text) // 4,
+                },
+            )
+        else:
+            self._reply(404, {"error": "not found"})
+
+    def _reply(self, status: int, body: dict):
+        data = json.dumps(body, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class _Server(ThreadingHTTPServer):
+    # 默认的 listen backlog 为 5，并发 worker 较多时会丢 SYN 并引入 1 秒的重传延迟
+    request_queue_size = 128
+
+
+def start_server(model: FakeModel, host: str = "127.0.0.1", port: int = 0):
+    """Serve `model` from a daemon thread; returns (server, base_url)."""
+    handler = type("Handler", (_Handler,), {"model": model})
+    server = _Server((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
@@ -0,0 +1,70 @@
+"""
+Import-time budget for the CLI entry point, based on `python -X importtime`.
+
+    python -m benchmark.import_time                 # best of 5 runs against the default budget
+    python -m benchmark.import_time --budget-ms 150
+
+Fails (exit code 1) when `import main` exceeds the budget, or when it eagerly imports a heavy
+dependency that should only be loaded on first use.
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# 这些依赖只应在首次使用时导入
+LAZY_MODULES = ("openai", "ollama", "bs4", "requests", "tqdm")
+
+
+def measure(module: str = "main"):
+    """Return (cumulative import time of `module` in microseconds, set of top-level modules imported)."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    cumulative = None
+    imported = set()
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, total, name = line.split("|")
+        name = name.strip()
+        imported.add(name.split(".")[0])
+        if name == module:
+            cumulative = int(total)
+    return cumulative, imported
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--module", default="main")
+    parser.add_argument("--budget-ms", type=float, default=300.0)
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    timings = []
+    eager = set()
+    for _ in range(args.runs):
+        cumulative, imported = measure(args.module)
+        timings.append(cumulative)
+        eager |= imported.intersection(LAZY_MODULES)
+    best = min(timings) / 1000
+    print(f"import {args.module}: best {best:.1f} ms over {args.runs} runs (budget {args.budget_ms:.0f} ms)")
+
+    failed = False
+    if best > args.budget_ms:
+        print(f"FAIL: import time exceeds the budget by {best - args.budget_ms:.1f} ms")
+        failed = True
+    if eager:
+        print(f"FAIL: imported eagerly: {', '.join(sorted(eager))}")
+        failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
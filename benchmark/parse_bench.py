@@ -0,0 +1,78 @@
+"""
+Compare the listing/abstract parsers of util/request.py on time and peak memory.
+
+    python -m benchmark.parse_bench --papers 2000
+    python -m benchmark.parse_bench --cassette run.jsonl.gz     # pages recorded with main.py --record
+"""
+
+import argparse
+import gzip
+import json
+import time
+import tracemalloc
+
+import util.request as request
+from benchmark import fake_arxiv
+
+
+def load_pages(args):
+    """Return (listing pages, abstract pages) as lists of HTML strings."""
+    if args.cassette:
+        listings, abstracts = [], []
+        with gzip.open(args.cassette, "rt", encoding="utf-8") as f:
+            for line in f:
+                entry = json.loads(line)
+                if entry["kind"] != "http":
+                    continue
+                if "/list/" in entry["key"]:
+                    listings.append(entry["response"])
+                elif "/abs/" in entry["key"]:
+                    abstracts.append(entry["response"])
+        return listings, abstracts
+
+    site = fake_arxiv.SyntheticArxiv(papers=args.papers, seed=args.seed)
+    listings = [site.render_listing("cs.CV", 0, args.papers, inline_abstract=False)]
+    abstracts = [site.render_abstract(paper["arxiv_id"]) for paper in site.listing("cs.CV")[:200]]
+    return listings, abstracts
+
+
+def measure(fn, pages, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for page in pages:
+            fn(page)
+        best = min(best, time.perf_counter() - start)
+
+    tracemalloc.start()
+    for page in pages:
+        fn(page)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return best, peak
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--papers", type=int, default=2000, help="Entries on the synthetic listing page.")
+    parser.add_argument("--cassette", help="Use the arXiv pages stored in a recorded cassette.")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    listings, abstracts = load_pages(args)
+    n_entries = sum(1 for page in listings for _ in request.listing_entries(page))
+    print(f"{len(listings)} listing pages ({n_entries} entries), {len(abstracts)} abstract pages")
+    print(f"{'parser':<8}{'page':<10}{'seconds':>10}{'peak MiB':>10}")
+    for backend in ("bs4", "stream"):
+        request.PARSER = backend
+        for name, fn, pages in (
+            ("listing", lambda html: list(request.listing_entries(html)), listings),
+            ("abstract", request.abstract_from_page, abstracts),
+        ):
+            seconds, peak = measure(fn, pages, args.repeat)
+            print(f"{backend:<8}{name:<10}{seconds:>10.3f}{peak / 1024 / 1024:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
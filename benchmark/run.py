@@ -0,0 +1,237 @@
+"""
+Offline end-to-end benchmark: fetch -> recommend -> render against local fake arXiv and LLM servers.
+
+    python -m benchmark.run --papers 1000 --categories cs.CV cs.AI
+    python -m benchmark.run --papers 1000 --save-baseline
+    python -m benchmark.run --papers 1000 --baseline benchmark/baseline.json
+
+Reports papers/sec, p50/p95/p99 latency and peak RSS per stage plus the rendered email size, and
+compares against a stored baseline (exit code 1 when a stage regresses by more than --tolerance).
+
+On Linux the kernel's peak-RSS counter is reset before each stage, so every stage reports its own
+peak. Elsewhere only the process-wide peak is available: the report marks it as cumulative and it is
+not compared against a per-stage baseline.
+"""
+
+import argparse
+import json
+import os
+import resource
+import sys
+import tempfile
+import time
+
+from benchmark import fake_arxiv, fake_llm
+from util.metrics import metrics, quantile
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(__file__), "baseline.json")
+
+
+def reset_peak_rss() -> bool:
+    """Reset the peak RSS of this process (Linux only); returns False when that is not supported."""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def peak_rss_mb() -> float:
+    """Peak RSS since the last reset_peak_rss() (VmHWM), or of the whole process without /proc."""
+    try:
+        with open("/proc/self/status", "r") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    # ru_maxrss 无法重置，是整个进程迄今为止的峰值；Linux 以 KiB 为单位，macOS 以字节为单位
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1024 / 1024 if sys.platform == "darwin" else peak / 1024
+
+
+def latency_stats(name: str, stages: tuple = None) -> dict:
+    samples = []
+    with metrics.lock:
+        for (metric, labels), values in metrics.histograms.items():
+            if metric == name and (stages is None or dict(labels).get("stage") in stages):
+                samples.extend(values)
+    return {
+        "p50": quantile(samples, 0.5),
+        "p95": quantile(samples, 0.95),
+        "p99": quantile(samples, 0.99),
+    }
+
+
+def run(args) -> dict:
+    site = fake_arxiv.SyntheticArxiv(papers=args.papers, seed=args.seed)
+    arxiv_server, arxiv_url = fake_arxiv.start_server(site)
+    model = fake_llm.FakeModel(args.latency, args.latency_mean, args.latency_jitter, args.error_rate, args.seed)
+    llm_server, llm_url = fake_llm.start_server(model)
+    os.environ["OLLAMA_HOST"] = llm_url
+
+    # ollama 在导入时读取 OLLAMA_HOST，因此在设置环境变量之后再导入
+    import util.request as request
+    from arxiv_daily import ArxivDaily
+
+    request.ARXIV_URL = arxiv_url
+    request.THROTTLE = False
+
+    stages = {}
+    per_stage = True
+    save_dir = tempfile.mkdtemp(prefix="arxiv-bench-")
+    try:
+        per_stage &= reset_peak_rss()
+        start = time.perf_counter()
+        daily = ArxivDaily(
+            args.categories,
+            args.papers,
+            args.max_paper_num,
+            args.provider,
+            "fake-model",
+            llm_url + "/v1",
+            "fake-key",
+            "I am interested in multimodal large language models and diffusion models.",
+            args.num_workers,
+            0.7,
+            save_dir=save_dir,
+            user="benchmark",
+        )
+        elapsed = time.perf_counter() - start
+        fetched = sum(len(papers) for papers in daily.papers.values())
+        stages["fetch"] = {
+            "papers": fetched,
+            "seconds": elapsed,
+            "papers_per_sec": fetched / elapsed,
+            **latency_stats("stage_duration_seconds", ("fetch_listing", "fetch_abstract")),
+            "peak_rss_mb": peak_rss_mb(),
+        }
+
+        per_stage &= reset_peak_rss()
+        start = time.perf_counter()
+        recommendations = daily.get_recommendation()
+        elapsed = time.perf_counter() - start
+        scored = len({p.arxiv_id for papers in daily.papers.values() for p in papers})
+        stages["recommend"] = {
+            "papers": scored,
+            "seconds": elapsed,
+            "papers_per_sec": scored / elapsed,
+            **latency_stats("llm_inference_seconds", ("score",)),
+            "peak_rss_mb": peak_rss_mb(),
+        }
+
+        per_stage &= reset_peak_rss()
+        start = time.perf_counter()
+        html = daily.render_email(recommendations)
+        elapsed = time.perf_counter() - start
+        stages["render"] = {
+            "papers": len(recommendations),
+            "seconds": elapsed,
+            "papers_per_sec": len(recommendations) / elapsed,
+            **latency_stats("llm_inference_seconds", ("summarize",)),
+            "peak_rss_mb": peak_rss_mb(),
+            "html_bytes": len(html.encode("utf-8")),
+        }
+    finally:
+        arxiv_server.shutdown()
+        llm_server.shutdown()
+
+    return {
+        "config": {
+            "papers": args.papers,
+            "categories": args.categories,
+            "num_workers": args.num_workers,
+            "provider": args.provider,
+            "latency": args.latency,
+            "latency_mean": args.latency_mean,
+            "error_rate": args.error_rate,
+        },
+        # "stage"：每个阶段各自的峰值；"cumulative"：进程迄今为止的峰值，后面的阶段沿用前面的数值
+        "rss_scope": "stage" if per_stage else "cumulative",
+        "stages": stages,
+    }
+
+
+def compare(result: dict, baseline: dict, tolerance: float) -> list:
+    """Return a list of human-readable regressions (throughput drop or RSS growth beyond tolerance)."""
+    regressions = []
+    if baseline.get("config") != result["config"]:
+        print("Warning: baseline was recorded with a different configuration.")
+    # 旧的基线没有 rss_scope，记录的是累计峰值
+    compare_rss = result["rss_scope"] == baseline.get("rss_scope", "cumulative") == "stage"
+    if not compare_rss:
+        print("Warning: peak RSS is not measured per stage in the baseline or in this run, skipping RSS checks.")
+    for stage, current in result["stages"].items():
+        previous = baseline.get("stages", {}).get(stage)
+        if not previous:
+            continue
+        if current["papers_per_sec"] < previous["papers_per_sec"] * (1 - tolerance):
+            regressions.append(
+                f"{stage}: {current['papers_per_sec']:.1f} papers/s vs baseline {previous['papers_per_sec']:.1f}"
+            )
+        if compare_rss and current["peak_rss_mb"] > previous["peak_rss_mb"] * (1 + tolerance):
+            regressions.append(
+                f"{stage}: peak RSS {current['peak_rss_mb']:.1f} MB vs baseline {previous['peak_rss_mb']:.1f} MB"
+            )
+        if "html_bytes" in previous and current["html_bytes"] > previous["html_bytes"] * (1 + tolerance):
+            regressions.append(
+                f"{stage}: email size {current['html_bytes']} bytes vs baseline {previous['html_bytes']} bytes"
+            )
+    return regressions
+
+
+def print_report(result: dict):
+    print(f"{'stage':<10}{'papers':>8}{'seconds':>10}{'papers/s':>11}{'p50':>9}{'p95':>9}{'p99':>9}{'RSS MB':>9}")
+    for stage, r in result["stages"].items():
+        print(
+            f"{stage:<10}{r['papers']:>8}{r['seconds']:>10.2f}{r['papers_per_sec']:>11.1f}"
+            f"{r['p50']:>9.4f}{r['p95']:>9.4f}{r['p99']:>9.4f}{r['peak_rss_mb']:>9.1f}"
+        )
+    if result["rss_scope"] != "stage":
+        print("RSS MB is the cumulative peak of the process, not of each stage.")
+    if "html_bytes" in result["stages"].get("render", {}):
+        print(f"email size: {result['stages']['render']['html_bytes']} bytes")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--papers", type=int, default=1000, help="Synthetic papers per category (100 - 10000).")
+    parser.add_argument("--categories", nargs="+", default=["cs.CV", "cs.AI"])
+    parser.add_argument("--max_paper_num", type=int, default=60)
+    parser.add_argument("--num_workers", type=int, default=16)
+    parser.add_argument("--provider", default="openai", choices=["openai", "ollama"])
+    parser.add_argument("--latency", default="lognormal", choices=["constant", "uniform", "lognormal"])
+    parser.add_argument("--latency_mean", type=float, default=0.05, help="Mean LLM latency in seconds.")
+    parser.add_argument("--latency_jitter", type=float, default=0.5)
+    parser.add_argument("--error_rate", type=float, default=0.0, help="Fraction of LLM requests failing with HTTP 500.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true", help="Store this run as the new baseline.")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    parser.add_argument("--output", help="Write the JSON result to this path.")
+    args = parser.parse_args(argv)
+
+    result = run(args)
+    print_report(result)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2)
+
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2)
+        print(f"Baseline saved to {args.baseline}")
+        return 0
+
+    if os.path.exists(args.baseline):
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            regressions = compare(result, json.load(f), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
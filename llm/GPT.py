@@ -43,7 +43,12 @@ class GPT():
                     temperature=temperature
                 )
                 response_message = result.choices[0].message.content
-                return response_message
+                usage = {
+                    "prompt_tokens": getattr(result.usage, "prompt_tokens", 0) or 0,
+                    "completion_tokens": getattr(result.usage, "completion_tokens", 0) or 0,
+                    "retries": i,
+                }
+                return response_message, usage
             except Exception as e:
                 if i < retries - 1:
                     print(f"Failed to call the API {i+1}/{retries}, will retry after {wait_time} seconds.")
@@ -55,9 +60,12 @@ class GPT():
                     print(e)
                     raise
 
-    def inference(self, prompt, temperature=0.7):
+    def inference_with_usage(self, prompt, temperature=0.7):
         prompt = self.build_prompt(prompt)
-        response = self.call_gpt_eval(prompt, self.model_name, temperature=temperature)
+        return self.call_gpt_eval(prompt, self.model_name, temperature=temperature)
+
+    def inference(self, prompt, temperature=0.7):
+        response, _ = self.inference_with_usage(prompt, temperature=temperature)
         return response
     
 if __name__ == "__main__":
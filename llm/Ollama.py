@@ -5,9 +5,19 @@ class Ollama:
     def __init__(self, model):
         self.model_name = model
 
-    def inference(self, prompt):
-        response = generate(self.model_name, prompt)["response"]
-        response = response.split("</think>")[1].strip()
+    def inference_with_usage(self, prompt, temperature=0.7):
+        result = generate(self.model_name, prompt, options={"temperature": temperature})
+        response = result["response"]
+        response = response.split("</think>")[-1].strip()
+        usage = {
+            "prompt_tokens": result.get("prompt_eval_count") or 0,
+            "completion_tokens": result.get("eval_count") or 0,
+            "retries": 0,
+        }
+        return response, usage
+
+    def inference(self, prompt, temperature=0.7):
+        response, _ = self.inference_with_usage(prompt, temperature=temperature)
         return response
     
 if __name__ == "__main__":
@@ -15,4 +25,4 @@ if __name__ == "__main__":
     ollama = Ollama(model)
     prompt = "Hello, who are you?"
     response = ollama.inference(prompt)
-    print(response)
\ No newline at end of file
+    print(response)
@@ -1,2 +1,66 @@
-from .GPT import GPT
-from .Ollama import Ollama
\ No newline at end of file
+"""
+LLM backends, resolved lazily from the configured provider name.
+
+Each backend module imports its SDK (openai, ollama, ...) at import time, so only the backend a run
+actually uses is ever imported.
+"""
+
+import threading
+from importlib import import_module
+
+# provider（小写）-> (模块, 类名)
+PROVIDERS = {
+    "openai": ("llm.GPT", "GPT"),
+    "siliconflow": ("llm.GPT", "GPT"),
+    "ollama": ("llm.Ollama", "Ollama"),
+}
+
+# (provider, model, base_url, api_key) -> 已创建的客户端
+_clients = {}
+_clients_lock = threading.Lock()
+
+__all__ = ["PROVIDERS", "register_provider", "get_backend", "load_model"]
+
+
+def register_provider(provider: str, module: str, class_name: str):
+    PROVIDERS[provider.lower()] = (module, class_name)
+
+
+def _import_backend(module: str, class_name: str):
+    backend = getattr(import_module(module), class_name)
+    # 导入子模块会把 llm.GPT 绑定为模块对象，这里改回类本身
+    globals()[class_name] = backend
+    return backend
+
+
+def get_backend(provider: str):
+    """Import and return the backend class registered for `provider`."""
+    try:
+        module, class_name = PROVIDERS[provider.lower()]
+    except KeyError:
+        raise ValueError(f"Model provider '{provider}' not supported.") from None
+    return _import_backend(module, class_name)
+
+
+def load_model(provider: str, model: str, base_url=None, api_key=None):
+    """
+    Return the client for (provider, model, base_url, api_key). Clients are created once per process
+    and shared, so users on the same endpoint (and every run of a daemon) reuse its connection pool.
+    """
+    key = (provider.lower(), model, base_url, api_key)
+    with _clients_lock:
+        if key not in _clients:
+            backend = get_backend(provider)
+            if provider.lower() == "ollama":
+                _clients[key] = backend(model)
+            else:
+                _clients[key] = backend(model, base_url, api_key)
+        return _clients[key]
+
+
+def __getattr__(name):
+    # 兼容 `from llm import GPT` / `from llm import Ollama`
+    for module, class_name in PROVIDERS.values():
+        if class_name == name:
+            return _import_backend(module, class_name)
+    raise AttributeError(f"module 'llm' has no attribute '{name}'")
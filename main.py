@@ -1,40 +1,41 @@
 from util.construct_email import send_email
 from arxiv_daily import ArxivDaily
+from util.metrics import metrics
+from util.profiling import profiler
+from util.cassette import cassette
+from util.delivery import delivery
+from util.history import history
+from util.config import load_config, get_config_value, server_chan_keys
+from util.ratelimit import ARXIV, llm_limiter, rate_limits
+from util.executor import print_report, run_users
+import util.request
+from datetime import datetime
 import os
-import json
-
-def load_config():
-    """Loads config_private.json if it exists, otherwise loads config.json."""
-    config_path = None
-    if os.path.exists("config_private.json"):
-        config_path = "config_private.json"
-    elif os.path.exists("config.json"):
-        config_path = "config.json"
-
-    if config_path:
-        with open(config_path, "r", encoding="utf-8") as f:
-            return json.load(f)
-    else:
-        raise FileNotFoundError(
-            "Configuration file not found. Please create 'config.json' or 'config_private.json'."
-        )
-def get_config_value(config, tool_section, key, default=None, required=False):
-    if tool_section and key == "provider":
-        value = config.get(tool_section, {}).get(key)
-    else:
-        value = config.get(tool_section, {}).get(key) or config.get("common", {}).get(key) or config.get(key)
-    if required and value is None:
-        raise ValueError(f"Missing required parameter: {key}")
-    return value if value is not None else default
-
-def run_arxiv_daily(tool_section=None,name=None):
-    config = load_config()
+import tempfile
+
+# 回放时所有输出（历史库、markdown 归档、邮件 HTML、指标）写入的临时目录
+REPLAY_DIR = None
+
+
+def get_save_dir(config):
+    """Output directory of the run; a replay writes to REPLAY_DIR so the real history and archives stay untouched."""
+    if cassette.replaying:
+        global REPLAY_DIR
+        if REPLAY_DIR is None:
+            REPLAY_DIR = tempfile.mkdtemp(prefix="arxiv-replay-")
+        return REPLAY_DIR
+    return get_config_value(config, None, "save_dir", default="./arxiv_history")
+
+
+def run_arxiv_daily(tool_section=None, name=None, config=None, seen=None):
+    if config is None:
+        config = load_config()
 
     # Common parameters
     max_paper_num = get_config_value(config, None, "max_paper_num", default=60)
     max_entries = get_config_value(config, None, "max_entries", default=100)
     save = get_config_value(config, None, "save", default=False)
-    save_dir = get_config_value(config, None, "save_dir", default="./arxiv_history")
+    save_dir = get_save_dir(config)
 
     # Tool-specific parameters, with fallback to common and default
     provider = get_config_value(config, tool_section, "provider", required=True)
@@ -49,6 +50,9 @@ def run_arxiv_daily(tool_section=None,name=None):
     temperature = get_config_value(config, tool_section, "temperature", default=0.7)
     title = get_config_value(config, tool_section, "title", default="Daily arXiv")
     server_chan_key = get_config_value(config, tool_section, "Server_chan_KEY", default="")
+    prices = get_config_value(config, tool_section, "prices", default={})
+    email_max_bytes = get_config_value(config, tool_section, "email_max_bytes")
+    dedup_threshold = get_config_value(config, tool_section, "dedup_threshold", default=0.8)
 
     person_config = config.get(name, {})
     categories = person_config.get("categories", [])
@@ -87,6 +91,11 @@ def run_arxiv_daily(tool_section=None,name=None):
         temperature,
         save_dir=save_dir if save else None,
         server_chan_key=server_chan_key,
+        user=name,
+        prices=prices,
+        email_max_bytes=email_max_bytes,
+        dedup_threshold=dedup_threshold,
+        seen=seen,
     )
 
     arxiv_daily.send_email(
@@ -98,17 +107,117 @@ def run_arxiv_daily(tool_section=None,name=None):
         title,
     )
 
+def configure(config, tool):
+    """Apply the process-wide settings of `config`; called again by the daemon when the file changes."""
+    save_dir = get_save_dir(config)
+    # 列表页解析后端："stream"（默认）或 "bs4"
+    util.request.PARSER = get_config_value(config, None, "parser", default="stream")
+    # 发送失败的邮件与通知保存在 outbox 中，每次运行开始时先重试
+    delivery.outbox_dir = get_config_value(config, None, "outbox_dir", default=os.path.join(save_dir, "outbox"))
+    delivery.smtp_security = get_config_value(config, tool, "smtp_security", default="auto")
+    # 重发队列中的条目最多重试的次数与保留时长，超出后移入 outbox/dead
+    delivery.max_attempts = get_config_value(config, None, "outbox_max_attempts", default=5)
+    delivery.max_age_hours = get_config_value(config, None, "outbox_max_age_hours", default=72)
+    # 所有用户共享的限速（每秒请求数）：arXiv 一个，所用的 LLM 端点一个
+    rate_limits.configure(ARXIV, get_config_value(config, None, "arxiv_rate_limit", default=1))
+    rate_limits.configure(
+        llm_limiter(get_config_value(config, tool, "provider", default=""), get_config_value(config, tool, "base_url")),
+        get_config_value(config, tool, "llm_rate_limit"),
+    )
+    # 历史库：所有论文、打分结果与邮件内容，markdown 归档由它生成
+    if get_config_value(config, None, "save", default=False):
+        history_db = os.path.join(save_dir, "history.sqlite3")
+        if not cassette.replaying:
+            history_db = get_config_value(config, None, "history_db", default=history_db)
+        history.open(history_db)
+
+
 if __name__ == "__main__":
+    import argparse
+    import signal
     import sys
+    import time
+    from util.scheduler import Daemon
 # "main_silicon_flow.sh", "main_gpt.sh", "main_ollama.sh" are the entry points for different tools
-    tool = "main_silicon_flow"  # Default to common settings
-    if len(sys.argv) > 1:
-        tool = sys.argv[1]  # Use the first command-line argument as the tool section
+    parser = argparse.ArgumentParser()
+    # Use the first command-line argument as the tool section
+    parser.add_argument("tool", nargs="?", default="main_silicon_flow")
+    parser.add_argument(
+        "--profile",
+        nargs="?",
+        const="all",
+        choices=["cpu", "memory", "all"],
+        help="Profile each stage (fetch, parse, infer, render, send) and dump the results to save_dir.",
+    )
+    parser.add_argument("--record", metavar="CASSETTE", help="Record all arXiv and LLM traffic to a cassette file.")
+    parser.add_argument("--replay", metavar="CASSETTE", help="Replay a recorded cassette instead of using the network.")
+    parser.add_argument(
+        "--daemon",
+        action="store_true",
+        help="Stay resident and send each user's digest on its cron 'schedule', polling arXiv in between.",
+    )
+    parser.add_argument(
+        "--replay-speed",
+        choices=["fast", "original"],
+        default="fast",
+        help="Replay as fast as possible, or with the recorded timings.",
+    )
+    args, _ = parser.parse_known_args()
+    tool = args.tool
 
     # Remove .sh suffix if present for backwards compatibility
     if tool.endswith(".sh"):
         tool = tool[:-3]
     config = load_config()
     names = config.get("names", [])
-    for name in names:
-        run_arxiv_daily(tool_section=tool,name=name)
+    if args.record:
+        cassette.record(args.record)
+    elif args.replay:
+        cassette.replay(args.replay, realtime=args.replay_speed == "original")
+    save_dir = get_save_dir(config)
+    # Prometheus textfile 与 JSON 运行报告的输出目录
+    metrics_dir = save_dir if cassette.replaying else get_config_value(config, None, "metrics_dir", default=save_dir)
+    if cassette.replaying:
+        print(f"Replay mode: outputs are written to {save_dir}")
+    configure(config, tool)
+    if not cassette.replaying:
+        delivery.retry_outbox(
+            {
+                get_config_value(config, tool, "sender"): get_config_value(config, tool, "sender_password"),
+            },
+            server_chan_keys(config, tool),
+        )
+    if args.profile:
+        profiler.enable(save_dir, cpu=args.profile in ("cpu", "all"), memory=args.profile in ("memory", "all"))
+    failed = []
+    try:
+        if args.daemon:
+            daemon = Daemon(
+                tool,
+                lambda name, config, seen: run_arxiv_daily(tool_section=tool, name=name, config=config, seen=seen),
+                configure=lambda config: configure(config, tool),
+            )
+            signal.signal(signal.SIGTERM, lambda signum, frame: daemon.stop())
+            signal.signal(signal.SIGINT, lambda signum, frame: daemon.stop())
+            daemon.run_forever()
+        else:
+            # 多个用户并发运行，配置只读取一次
+            start = time.perf_counter()
+            results = run_users(
+                names,
+                lambda name: run_arxiv_daily(tool_section=tool, name=name, config=config),
+                max_workers=get_config_value(config, tool, "max_concurrent_users", default=4),
+            )
+            print_report(results, time.perf_counter() - start)
+            failed = [name for name, result in results.items() if result["error"]]
+    finally:
+        delivery.close()
+        history.close()
+        prom_path, report_path = metrics.save(metrics_dir, datetime.now().strftime("%Y-%m-%d"))
+        print(f"Metrics written to {prom_path} and {report_path}")
+        for path in profiler.dump():
+            print(f"Profile written to {path}")
+        if cassette.save():
+            print(f"Cassette written to {cassette.path}")
+    if failed:
+        sys.exit(f"Digest failed for: {', '.join(failed)}")
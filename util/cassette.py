@@ -0,0 +1,93 @@
+"""
+Record / replay of arXiv HTTP responses and LLM prompt/response pairs.
+
+A cassette is a gzip-compressed JSON-lines file. Each line is one interaction:
+    {"kind": "http", "key": <url>, "response": <html>, "elapsed": <seconds>}
+    {"kind": "llm", "key": <sha1 of model/temperature/prompt>, "response": <text>, "usage": {...}, "elapsed": <seconds>}
+"""
+
+import gzip
+import hashlib
+import json
+import threading
+import time
+from collections import defaultdict, deque
+
+
+class Cassette:
+    def __init__(self):
+        self.mode = None
+        self.path = None
+        self.realtime = False
+        self.recorded = []
+        self.tapes = defaultdict(deque)
+        self.lock = threading.Lock()
+
+    @property
+    def recording(self) -> bool:
+        return self.mode == "record"
+
+    @property
+    def replaying(self) -> bool:
+        return self.mode == "replay"
+
+    def record(self, path: str):
+        self.mode = "record"
+        self.path = path
+
+    def replay(self, path: str, realtime: bool = False):
+        """Serve interactions from `path`; with realtime=True the recorded latencies are reproduced."""
+        self.mode = "replay"
+        self.path = path
+        self.realtime = realtime
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            for line in f:
+                entry = json.loads(line)
+                self.tapes[(entry["kind"], entry["key"])].append(entry)
+
+    def save(self):
+        if not self.recording:
+            return None
+        with self.lock:
+            with gzip.open(self.path, "wt", encoding="utf-8") as f:
+                for entry in self.recorded:
+                    f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        return self.path
+
+    def _play(self, kind: str, key: str, call):
+        if self.replaying:
+            with self.lock:
+                tape = self.tapes.get((kind, key))
+                if not tape:
+                    raise LookupError(f"No recorded {kind} interaction for {key!r} in {self.path}")
+                # 同一请求被录制多次时按顺序回放，最后一条会被重复使用
+                entry = tape.popleft() if len(tape) > 1 else tape[0]
+            if self.realtime:
+                time.sleep(entry["elapsed"])
+            return entry
+
+        start = time.perf_counter()
+        entry = call()
+        if self.recording:
+            entry.update(kind=kind, key=key, elapsed=time.perf_counter() - start)
+            with self.lock:
+                self.recorded.append(entry)
+        return entry
+
+    def http(self, url: str, fetch) -> str:
+        """Return the body for `url`, calling fetch() unless replaying."""
+        return self._play("http", url, lambda: {"response": fetch()})["response"]
+
+    def llm(self, model: str, temperature: float, prompt: str, inference):
+        """Return (response, usage) for the prompt, calling inference() unless replaying."""
+        key = hashlib.sha1(f"{model}\n{temperature}\n{prompt}".encode("utf-8")).hexdigest()
+
+        def call():
+            response, usage = inference()
+            return {"response": response, "usage": usage}
+
+        entry = self._play("llm", key, call)
+        return entry["response"], entry["usage"]
+
+
+cassette = Cassette()
@@ -0,0 +1,44 @@
+"""
+Loading of config_private.json / config.json and lookup of values with tool -> common -> top-level
+fallback.
+"""
+
+import json
+import os
+
+
+def config_path():
+    """Return config_private.json if it exists, otherwise config.json, or None if neither exists."""
+    if os.path.exists("config_private.json"):
+        return "config_private.json"
+    if os.path.exists("config.json"):
+        return "config.json"
+    return None
+
+
+def load_config():
+    """Loads config_private.json if it exists, otherwise loads config.json."""
+    path = config_path()
+    if path:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    else:
+        raise FileNotFoundError(
+            "Configuration file not found. Please create 'config.json' or 'config_private.json'."
+        )
+
+
+def get_config_value(config, tool_section, key, default=None, required=False):
+    if tool_section and key == "provider":
+        value = config.get(tool_section, {}).get(key)
+    else:
+        value = config.get(tool_section, {}).get(key) or config.get("common", {}).get(key) or config.get(key)
+    if required and value is None:
+        raise ValueError(f"Missing required parameter: {key}")
+    return value if value is not None else default
+
+
+def server_chan_keys(config, tool_section) -> list:
+    """Comma-separated ServerChan keys of the tool section; queued notifications only store their fingerprints."""
+    keys = get_config_value(config, tool_section, "Server_chan_KEY", default="")
+    return [key.strip() for key in keys.split(",") if key.strip()]
@@ -2,14 +2,15 @@ import math
 from email.header import Header
 from email.mime.text import MIMEText
 from email.utils import parseaddr, formataddr
+from html import escape
+from io import StringIO
+from string import Formatter
 import smtplib
 import datetime
 from loguru import logger
 
-framework = """
-<!DOCTYPE HTML>
-<html>
-<head>
+# 所有卡片与总结共用的样式，只在 <head> 中出现一次，代替每张卡片上重复的内联样式
+STYLE = """
   <style>
     .star-wrapper {
       font-size: 1.3em; /* 调整星星大小 */
@@ -27,7 +28,86 @@ framework = """
     .full-star {
       vertical-align: middle;
     }
+    .card {
+      font-family: Arial, sans-serif;
+      border: 1px solid #ddd;
+      border-radius: 8px;
+      padding: 16px;
+      margin: 16px 0;
+      background-color: #f9f9f9;
+    }
+    .card-title {
+      font-size: 20px;
+      font-weight: bold;
+      color: #333;
+    }
+    .card-row {
+      font-size: 14px;
+      color: #333;
+      padding: 8px 0;
+    }
+    .pdf-button {
+      display: inline-block;
+      text-decoration: none;
+      font-size: 14px;
+      font-weight: bold;
+      color: #fff;
+      background-color: #d9534f;
+      padding: 8px 16px;
+      border-radius: 4px;
+    }
+    h2 {
+      color: #2c3e50;
+      border-bottom: 3px solid #3498db;
+      padding-bottom: 12px;
+      margin: 25px 0 20px 0;
+      font-size: 28px;
+      font-weight: bold;
+      text-shadow: 1px 1px 2px rgba(0,0,0,0.1);
+    }
+    p {
+      color: #34495e;
+      line-height: 1.8;
+      margin: 15px 0;
+      font-size: 16px;
+    }
+    ol {
+      color: #34495e;
+      line-height: 1.8;
+      font-size: 16px;
+    }
+    li {
+      margin: 15px 0;
+      font-size: 16px;
+    }
+    .paper-title {
+      color: #2980b9;
+      font-weight: bold;
+      font-size: 20px;
+    }
+    .relevance {
+      color: #e74c3c;
+      font-style: italic;
+      font-size: 18px;
+      font-weight: bold;
+    }
+    .abstract, .analysis {
+      margin-left: 25px;
+      color: #2c3e50;
+      font-size: 16px;
+      line-height: 1.8;
+    }
   </style>
+"""
+
+framework = (
+    """
+<!DOCTYPE HTML>
+<html>
+<head>
+"""
+    + STYLE
+    + """
 </head>
 <body>
 
@@ -43,107 +123,107 @@ To unsubscribe, remove your email in your Github Action setting.
 </body>
 </html>
 """
+)
+_HEAD, _TAIL = framework.split("__CONTENT__")
+
+
+def _compile(template: str):
+    """Split a str.format template once into (literal, field) pairs so rendering is a plain join."""
+    return [(literal, field) for literal, field, _, _ in Formatter().parse(template)]
+
+
+def _render(compiled, values: dict) -> str:
+    parts = []
+    for literal, field in compiled:
+        parts.append(literal)
+        if field is not None:
+            parts.append(values[field])
+    return "".join(parts)
+
+
+_BLOCK = _compile(
+    """
+<table class="card" border="0" cellpadding="0" cellspacing="0" width="100%">
+<tr><td class="card-title">{title}</td></tr>
+<tr><td class="card-row"><strong>Relevance:</strong> {rate}</td></tr>
+<tr><td class="card-row"><strong>arXiv ID:</strong> {arxiv_id}</td></tr>
+<tr><td class="card-row"><strong>TLDR:</strong> {abstract}</td></tr>
+<tr><td class="card-row"><a href="{pdf_url}" class="pdf-button">PDF</a></td></tr>
+</table>
+"""
+)
+
+_OVERFLOW = _compile(
+    """
+<table class="card" border="0" cellpadding="0" cellspacing="0" width="100%">
+<tr><td class="card-row">{count} more papers did not fit in this email. The complete digest is archived as {archive}.</td></tr>
+</table>
+"""
+)
 
 
 def get_empty_html():
     block_template = """
-  <table border="0" cellpadding="0" cellspacing="0" width="100%" style="font-family: Arial, sans-serif; border: 1px solid #ddd; border-radius: 8px; padding: 16px; background-color: #f9f9f9;">
+  <table class="card" border="0" cellpadding="0" cellspacing="0" width="100%">
   <tr>
-    <td style="font-size: 20px; font-weight: bold; color: #333;">
+    <td class="card-title">
         No Papers Today. Take a Rest!
     </td>
   </tr>
+  </table>
   """
     return block_template
 
 
 def get_summary_html(summary: str):
-    summary = summary.replace("{", "{{").replace("}", "}}")
-    style = """
-        <style>
-            h2 {
-                color: #2c3e50;
-                border-bottom: 3px solid #3498db;
-                padding-bottom: 12px;
-                margin: 25px 0 20px 0;
-                font-size: 28px;
-                font-weight: bold;
-                text-shadow: 1px 1px 2px rgba(0,0,0,0.1);
-            }
-            p {
-                color: #34495e;
-                line-height: 1.8;
-                margin: 15px 0;
-                font-size: 16px;
-            }
-            ol {
-                color: #34495e;
-                line-height: 1.8;
-                font-size: 16px;
-            }
-            li {
-                margin: 15px 0;
-                font-size: 16px;
-            }
-            .paper-title {
-                color: #2980b9;
-                font-weight: bold;
-                font-size: 20px;
-            }
-            .relevance {
-                color: #e74c3c;
-                font-style: italic;
-                font-size: 18px;
-                font-weight: bold;
-            }
-            .abstract, .analysis {
-                margin-left: 25px;
-                color: #2c3e50;
-                font-size: 16px;
-                line-height: 1.8;
-            }
-        </style>
-    """
-    summary = summary.replace("</head>", f"{style}</head>")
+    # 总结所需的样式已包含在 framework 的公共 <style> 中
     return summary
 
 
 def get_block_html(title: str, rate: str, arxiv_id: str, abstract: str, pdf_url: str):
-    block_template = """
-    <table border="0" cellpadding="0" cellspacing="0" width="100%" style="font-family: Arial, sans-serif; border: 1px solid #ddd; border-radius: 8px; padding: 16px; background-color: #f9f9f9;">
-    <tr>
-        <td style="font-size: 20px; font-weight: bold; color: #333;">
-            {title}
-        </td>
-    </tr>
-    <tr>
-        <td style="font-size: 14px; color: #333; padding: 8px 0;">
-            <strong>Relevance:</strong> {rate}
-        </td>
-    </tr>
-    <tr>
-        <td style="font-size: 14px; color: #333; padding: 8px 0;">
-            <strong>arXiv ID:</strong> {arxiv_id}
-        </td>
-    </tr>
-    <tr>
-        <td style="font-size: 14px; color: #333; padding: 8px 0;">
-            <strong>TLDR:</strong> {abstract}
-        </td>
-    </tr>
-
-    <tr>
-        <td style="padding: 8px 0;">
-            <a href="{pdf_url}" style="display: inline-block; text-decoration: none; font-size: 14px; font-weight: bold; color: #fff; background-color: #d9534f; padding: 8px 16px; border-radius: 4px;">PDF</a>
-        </td>
-    </tr>
-</table>
-"""
-    return block_template.format(
-        title=title, rate=rate, arxiv_id=arxiv_id, abstract=abstract, pdf_url=pdf_url
+    return _render(
+        _BLOCK,
+        {
+            "title": escape(title),
+            "rate": rate,
+            "arxiv_id": escape(arxiv_id),
+            "abstract": escape(abstract),
+            "pdf_url": escape(pdf_url),
+        },
     )
 
 
+def render_html(summary: str, blocks: list, max_bytes: int = None, archive: str = ""):
+    """
+    Stream the summary and the paper blocks into one HTML document.
+
+    With max_bytes, blocks are appended only while the UTF-8 size stays within the budget; the rest
+    is replaced by a note naming `archive`, the file the caller saves the complete digest to (a file
+    name only, the recipient cannot open paths on the server). Returns (html, number of blocks included).
+    """
+    out = StringIO()
+    out.write(_HEAD)
+    out.write(summary)
+    size = len(_HEAD.encode("utf-8")) + len(summary.encode("utf-8")) + len(_TAIL.encode("utf-8"))
+    if max_bytes:
+        # 预留溢出提示所需的空间
+        size += len(_render(_OVERFLOW, {"count": str(len(blocks)), "archive": escape(archive)}).encode("utf-8"))
+
+    included = 0
+    for block in blocks:
+        block_size = len(block.encode("utf-8"))
+        if max_bytes and size + block_size > max_bytes:
+            break
+        out.write(block)
+        size += block_size
+        included += 1
+
+    if included < len(blocks):
+        out.write(_render(_OVERFLOW, {"count": str(len(blocks) - included), "archive": escape(archive)}))
+    out.write(_TAIL)
+    return out.getvalue(), included
+
+
 def get_stars(score: float):
     full_star = '<span class="full-star">⭐</span>'
     half_star = '<span class="half-star">⭐</span>'
@@ -0,0 +1,116 @@
+"""
+Version-aware arXiv IDs and MinHash/LSH near-duplicate detection over title + abstract.
+
+Signatures are NUM_PERM one-permutation MinHash values of word 3-gram shingles. LSH splits them
+into BANDS bands of ROWS rows, so two papers become candidates when their Jaccard similarity is
+roughly above (1 / BANDS) ** (1 / ROWS) ~= 0.5; candidates are then checked with the estimated
+similarity.
+"""
+
+import re
+import struct
+from hashlib import blake2b
+
+NUM_PERM = 64
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+_BIN_BITS = NUM_PERM.bit_length() - 1
+# 64 位哈希去掉桶号后剩下 58 位，空桶偏移量放在更高的位上
+_EMPTY_OFFSET = 1 << (64 - _BIN_BITS)
+_SIGNATURE = struct.Struct(f"<{NUM_PERM}Q")
+
+_VERSION = re.compile(r"^(?:arxiv:)?(.+?\d)(?:v(\d+))?$", re.IGNORECASE)
+_WORD = re.compile(r"\w+")
+
+
+def normalize_id(arxiv_id: str):
+    """
+    Split an arXiv ID into (base ID, version): "2510.12345v2" -> ("2510.12345", 2),
+    "hep-th/9901001" -> ("hep-th/9901001", 0). Also accepts the "arXiv:" prefix and ".pdf" suffix.
+    """
+    arxiv_id = arxiv_id.strip()
+    if arxiv_id.endswith(".pdf"):
+        arxiv_id = arxiv_id[:-4]
+    match = _VERSION.match(arxiv_id)
+    return match.group(1), int(match.group(2) or 0)
+
+
+def shingles(text: str, k: int = 3) -> set:
+    words = _WORD.findall(text.lower())
+    if len(words) < k:
+        return {" ".join(words)}
+    return {" ".join(words[i : i + k]) for i in range(len(words) - k + 1)}
+
+
+def minhash(text: str) -> tuple:
+    """
+    One-permutation MinHash signature (NUM_PERM ints) of the word 3-gram shingles of `text`.
+
+    Each shingle is hashed once: the low bits pick a bin, the rest is the value, and every bin keeps
+    its minimum. Empty bins borrow from the next non-empty bin (rotation densification), so one
+    blake2b call per shingle replaces NUM_PERM independent hash functions.
+    """
+    bins = [None] * NUM_PERM
+    for shingle in shingles(text):
+        h = int.from_bytes(blake2b(shingle.encode("utf-8"), digest_size=8).digest(), "little")
+        index, value = h & (NUM_PERM - 1), h >> _BIN_BITS
+        if bins[index] is None or value < bins[index]:
+            bins[index] = value
+    signature = []
+    for index in range(NUM_PERM):
+        offset = 0
+        # 空桶取右侧（循环）第一个非空桶的值，并加上与距离相关的偏移量以区分来源
+        while bins[(index + offset) % NUM_PERM] is None:
+            offset += 1
+        signature.append(bins[(index + offset) % NUM_PERM] + offset * _EMPTY_OFFSET)
+    return tuple(signature)
+
+
+def paper_signature(paper) -> tuple:
+    return minhash(f"{paper.title}\n{paper.abstract}")
+
+
+def similarity(a: tuple, b: tuple) -> float:
+    """Estimated Jaccard similarity of two signatures."""
+    return sum(1 for x, y in zip(a, b) if x == y) / NUM_PERM
+
+
+def bands(signature: tuple) -> list:
+    """(band, bucket) keys of a signature; buckets fit in a signed 64-bit SQLite integer."""
+    keys = []
+    for band in range(BANDS):
+        rows = signature[band * ROWS : (band + 1) * ROWS]
+        digest = blake2b(struct.pack(f"<{ROWS}Q", *rows), digest_size=8).digest()
+        keys.append((band, int.from_bytes(digest, "little", signed=True)))
+    return keys
+
+
+def pack(signature: tuple) -> bytes:
+    return _SIGNATURE.pack(*signature)
+
+
+def unpack(blob: bytes) -> tuple:
+    return _SIGNATURE.unpack(blob)
+
+
+class LSHIndex:
+    """In-memory LSH index, used to find near-duplicates among the papers of one run."""
+
+    def __init__(self):
+        self.buckets = {}
+        self.signatures = {}
+
+    def add(self, key, signature: tuple):
+        self.signatures[key] = signature
+        for band in bands(signature):
+            self.buckets.setdefault(band, []).append(key)
+
+    def query(self, signature: tuple, threshold: float):
+        """Return the indexed key most similar to `signature` if it reaches `threshold`, else None."""
+        candidates = {key for band in bands(signature) for key in self.buckets.get(band, ())}
+        best, best_score = None, threshold
+        for key in candidates:
+            score = similarity(signature, self.signatures[key])
+            if score >= best_score:
+                best, best_score = key, score
+        return best
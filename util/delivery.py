@@ -0,0 +1,266 @@
+"""
+Delivery of digests: pooled SMTP connections, concurrent ServerChan notifications, and an on-disk
+outbox for sends that failed so they can be retried by the next run.
+"""
+
+import hashlib
+import json
+import os
+import smtplib
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from loguru import logger
+
+from util.metrics import metrics
+
+# Server酱接口地址，测试时可以指向本地的 HTTP 桩服务
+SERVER_CHAN_URL = "https://sctapi.ftqq.com/{key}.send"
+
+
+def key_fingerprint(key: str) -> str:
+    """Short fingerprint that identifies a ServerChan key in the outbox without storing the secret."""
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()[:12]
+
+
+class Delivery:
+    """
+    One authenticated SMTP connection per (smtp_server, smtp_port, sender) is opened on first use and
+    reused for every user of the run; close() ends them. ServerChan keys are notified in parallel
+    over one pooled requests.Session with a timeout.
+
+    smtp_security: "auto" tries STARTTLS and falls back to SSL; "plain" talks unencrypted SMTP
+    (and only logs in if the server offers AUTH), for local SMTP sinks in tests.
+
+    Queued entries are retried at most max_attempts times and for at most max_age_hours; after
+    that they are moved to outbox_dir/dead so a revoked key or a server that stays down does not
+    slow down every later run.
+    """
+
+    def __init__(
+        self,
+        outbox_dir: str = None,
+        timeout: float = 30,
+        max_workers: int = 8,
+        smtp_security: str = "auto",
+        max_attempts: int = 5,
+        max_age_hours: float = 72,
+    ):
+        self.outbox_dir = outbox_dir
+        self.max_attempts = max_attempts
+        self.max_age_hours = max_age_hours
+        self.smtp_security = smtp_security
+        self.timeout = timeout
+        self.max_workers = max_workers
+        self.connections = {}
+        self.smtp_lock = threading.Lock()
+        self.session_lock = threading.Lock()
+        self._session = None
+
+    # ---------------------------------------------------------------- SMTP
+
+    def _connect(self, smtp_server: str, smtp_port: int, sender: str, password: str):
+        if self.smtp_security == "plain":
+            server = smtplib.SMTP(smtp_server, smtp_port, timeout=self.timeout)
+            server.ehlo()
+            if server.has_extn("auth"):
+                server.login(sender, password)
+            return server
+        try:
+            server = smtplib.SMTP(smtp_server, smtp_port, timeout=self.timeout)
+            server.starttls()
+        except Exception as e:
+            logger.warning(f"Failed to use TLS. {e}")
+            logger.warning(f"Try to use SSL.")
+            server = smtplib.SMTP_SSL(smtp_server, smtp_port, timeout=self.timeout)
+        server.login(sender, password)
+        return server
+
+    def send_mail(
+        self,
+        sender: str,
+        password: str,
+        smtp_server: str,
+        smtp_port: int,
+        receivers: list,
+        message: str,
+    ):
+        """Send an already-formatted message, reconnecting once if the pooled connection was dropped or timed out."""
+        key = (smtp_server, smtp_port, sender)
+        # smtplib 连接不是线程安全的，同一时间只允许一个线程使用
+        with self.smtp_lock:
+            for attempt in range(2):
+                server = self.connections.get(key)
+                try:
+                    if server is None:
+                        server = self.connections[key] = self._connect(smtp_server, smtp_port, sender, password)
+                    server.sendmail(sender, receivers, message)
+                    return
+                except Exception as e:
+                    self.connections.pop(key, None)
+                    if server is not None:
+                        server.close()
+                    # 连接在两个用户之间空闲超时被服务器关闭（或以 421 拒绝），重新登录一次
+                    if attempt or not self._dropped(e):
+                        raise
+
+    @staticmethod
+    def _dropped(e: Exception) -> bool:
+        """
+        Whether the server closed the session. Servers that time out an idle session often answer
+        421 to the next command instead of just dropping it; smtplib then closes the socket and raises
+        SMTPSenderRefused / SMTPDataError (or SMTPRecipientsRefused with 421 for every recipient).
+        """
+        if isinstance(e, smtplib.SMTPServerDisconnected):
+            return True
+        if isinstance(e, smtplib.SMTPResponseException):
+            return e.smtp_code == 421
+        if isinstance(e, smtplib.SMTPRecipientsRefused):
+            return any(code == 421 for code, _ in e.recipients.values())
+        return False
+
+    def close(self):
+        with self.smtp_lock:
+            for server in self.connections.values():
+                try:
+                    server.quit()
+                except Exception:
+                    pass
+            self.connections.clear()
+        if self._session is not None:
+            self._session.close()
+            self._session = None
+
+    # ----------------------------------------------------------- ServerChan
+
+    @property
+    def session(self):
+        with self.session_lock:
+            if self._session is None:
+                import requests
+                from requests.adapters import HTTPAdapter
+
+                self._session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=self.max_workers, pool_maxsize=self.max_workers)
+                self._session.mount("https://", adapter)
+                self._session.mount("http://", adapter)
+            return self._session
+
+    def _post_server_chan(self, key: str, title: str, desp: str) -> bool:
+        try:
+            response = self.session.post(
+                SERVER_CHAN_URL.format(key=key), data={"title": title, "desp": desp}, timeout=self.timeout
+            )
+            if response.status_code == 200:
+                print(f"Server酱通知发送成功 (KEY: {key[:4]}...)")
+                return True
+            print(f"Server酱通知发送失败,状态码:{response.status_code} (KEY: {key[:4]}...)")
+        except Exception as e:
+            print(f"使用KEY {key[:4]}...发送通知时出错: {str(e)}")
+        return False
+
+    def notify(self, keys: list, title: str, desp: str, queue_failures: bool = True) -> bool:
+        """Post to every ServerChan key concurrently; return True if at least one succeeded."""
+        if not keys:
+            return False
+        with metrics.timer("server_chan"):
+            with ThreadPoolExecutor(min(self.max_workers, len(keys))) as executor:
+                results = list(executor.map(lambda key: self._post_server_chan(key, title, desp), keys))
+        if queue_failures:
+            for key, ok in zip(keys, results):
+                if not ok:
+                    # 只保存 KEY 的指纹，重试时从配置中查回 KEY，与邮箱密码的处理方式一致
+                    self.enqueue("server_chan", {"key_id": key_fingerprint(key), "title": title, "desp": desp})
+        return any(results)
+
+    # --------------------------------------------------------------- outbox
+
+    def enqueue(self, kind: str, payload: dict):
+        """Persist a failed send in outbox_dir so that retry_outbox() can deliver it later."""
+        metrics.inc("delivery_queued_total", kind=kind)
+        if not self.outbox_dir:
+            logger.error(f"No outbox configured, dropping failed {kind} delivery.")
+            return None
+        os.makedirs(self.outbox_dir, exist_ok=True)
+        path = os.path.join(self.outbox_dir, f"{time.strftime('%Y%m%d-%H%M%S')}-{kind}-{uuid.uuid4().hex[:8]}.json")
+        self._write(path, {"kind": kind, "created": time.time(), "attempts": 0, **payload})
+        logger.info(f"Queued failed {kind} delivery at {path}")
+        return path
+
+    @staticmethod
+    def _write(path: str, entry: dict):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(entry, f, ensure_ascii=False)
+
+    def _dead_letter(self, path: str, entry: dict, reason: str):
+        dead_dir = os.path.join(self.outbox_dir, "dead")
+        os.makedirs(dead_dir, exist_ok=True)
+        self._write(os.path.join(dead_dir, os.path.basename(path)), entry)
+        os.remove(path)
+        metrics.inc("delivery_dead_lettered_total", kind=entry.get("kind", ""))
+        logger.warning(f"Gave up on queued {entry.get('kind')} delivery {os.path.basename(path)}: {reason}")
+
+    def retry_outbox(self, passwords: dict, server_chan_keys: list = ()) -> int:
+        """
+        Retry every queued delivery; delivered entries are removed from disk, entries that ran out of
+        attempts or are older than max_age_hours are moved to outbox_dir/dead.
+        passwords: {sender: password} used to re-authenticate queued emails.
+        server_chan_keys: configured ServerChan keys, matched against the stored fingerprints.
+        Returns the number of entries that were delivered.
+        """
+        if not self.outbox_dir or not os.path.isdir(self.outbox_dir):
+            return 0
+        keys = {key_fingerprint(key): key for key in server_chan_keys}
+        delivered = 0
+        for name in sorted(os.listdir(self.outbox_dir)):
+            if not name.endswith(".json"):
+                continue
+            path = os.path.join(self.outbox_dir, name)
+            with open(path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+            # 旧版本的队列直接保存了 KEY：本次仍可使用，文件立即改写为指纹
+            if "key" in entry:
+                key = entry.pop("key")
+                entry["key_id"] = key_fingerprint(key)
+                keys.setdefault(entry["key_id"], key)
+                self._write(path, entry)
+            age_hours = (time.time() - entry.get("created", time.time())) / 3600
+            if age_hours > self.max_age_hours:
+                self._dead_letter(path, entry, f"older than {self.max_age_hours} hours")
+                continue
+            if entry["kind"] == "server_chan" and not keys.get(entry["key_id"]):
+                self._dead_letter(path, entry, "its ServerChan key is no longer configured")
+                continue
+            try:
+                if entry["kind"] == "email":
+                    self.send_mail(
+                        entry["sender"],
+                        passwords[entry["sender"]],
+                        entry["smtp_server"],
+                        entry["smtp_port"],
+                        entry["receivers"],
+                        entry["message"],
+                    )
+                    ok = True
+                else:
+                    ok = self._post_server_chan(keys[entry["key_id"]], entry["title"], entry["desp"])
+            except Exception as e:
+                logger.warning(f"Retry of {name} failed: {e}")
+                ok = False
+            if ok:
+                os.remove(path)
+                delivered += 1
+                continue
+            entry["attempts"] = entry.get("attempts", 0) + 1
+            if entry["attempts"] >= self.max_attempts:
+                self._dead_letter(path, entry, f"failed {entry['attempts']} times")
+            else:
+                self._write(path, entry)
+        if delivered:
+            logger.info(f"Delivered {delivered} queued message(s) from {self.outbox_dir}")
+        return delivered
+
+
+delivery = Delivery()
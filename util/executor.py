@@ -0,0 +1,48 @@
+"""
+Concurrent execution of per-user digests with failure isolation and wall-clock reporting.
+"""
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from loguru import logger
+
+from util.metrics import metrics
+
+
+def run_users(names: list, run_user, max_workers: int = 4) -> dict:
+    """
+    Run run_user(name) for every user on a thread pool of at most `max_workers` threads. The
+    pipelines spend most of their time waiting on arXiv and the LLM, so threads are enough, and they
+    share the process-wide metrics, history, delivery and rate limiters.
+
+    A failing user is logged and does not affect the others. Returns
+    {name: {"seconds": wall-clock time, "error": exception or None}} in the order of `names`.
+    """
+
+    def run(name):
+        start = time.perf_counter()
+        error = None
+        try:
+            with metrics.timer("user_run", user=name):
+                run_user(name)
+        except Exception as e:
+            error = e
+            logger.exception(f"Digest of {name} failed: {e}")
+        return {"seconds": time.perf_counter() - start, "error": error}
+
+    if not names:
+        return {}
+    with ThreadPoolExecutor(max(1, min(max_workers, len(names))), thread_name_prefix="user") as executor:
+        futures = {name: executor.submit(run, name) for name in names}
+        return {name: future.result() for name, future in futures.items()}
+
+
+def print_report(results: dict, total: float):
+    """Print the wall-clock time of every user next to the total time of the batch."""
+    print(f"{'user':<16}{'status':<8}{'seconds':>10}")
+    for name, result in results.items():
+        status = "failed" if result["error"] else "ok"
+        print(f"{name:<16}{status:<8}{result['seconds']:>10.1f}")
+    serial = sum(result["seconds"] for result in results.values())
+    print(f"Total wall-clock {total:.1f}s for {len(results)} users (sum of per-user times {serial:.1f}s).")
@@ -0,0 +1,556 @@
+"""
+Local SQLite history of every fetched paper, every scored result and every sent digest.
+
+The store is the record the markdown archive is generated from, and it can answer "was this paper
+already recommended?" or re-render an old digest without any network access. Titles, abstracts and
+summaries are indexed with FTS5.
+
+    python -m util.history search "diffusion" --since 2026-07-01
+    python -m util.history search --raw 'title:transformer AND (video OR "text-to-image")'
+    python -m util.history seen 2510.12345
+    python -m util.history render --user p1 --date 2026-10-19 --format html -o digest.html
+"""
+
+import os
+import sqlite3
+import threading
+from datetime import datetime, timedelta
+
+from util import dedup
+from util.paper import Paper
+
+DEFAULT_PATH = os.path.join("./arxiv_history", "history.sqlite3")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS papers (
+    id           INTEGER PRIMARY KEY,
+    arxiv_id     TEXT NOT NULL UNIQUE,
+    title        TEXT NOT NULL,
+    abstract     TEXT NOT NULL,
+    comments     TEXT,
+    pdf_url      TEXT,
+    abstract_url TEXT,
+    category     TEXT,
+    -- 旧版本保存的最近一次 LLM 总结；总结现在按用户保存在 results 中，由 results_fts 索引
+    summary      TEXT NOT NULL DEFAULT '',
+    first_seen   TEXT NOT NULL,
+    last_seen    TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS papers_first_seen ON papers(first_seen);
+
+-- 每个用户每天的打分结果；rank 为邮件中的名次，未入选的论文为 NULL
+CREATE TABLE IF NOT EXISTS results (
+    user            TEXT NOT NULL,
+    run_date        TEXT NOT NULL,
+    arxiv_id        TEXT NOT NULL,
+    model           TEXT,
+    abstract_cn     TEXT,
+    summary         TEXT,
+    relevance_score REAL,
+    rank            INTEGER,
+    PRIMARY KEY (user, run_date, arxiv_id)
+);
+CREATE INDEX IF NOT EXISTS results_paper ON results(arxiv_id);
+
+CREATE TABLE IF NOT EXISTS runs (
+    user         TEXT NOT NULL,
+    run_date     TEXT NOT NULL,
+    description  TEXT,
+    summary_html TEXT,
+    PRIMARY KEY (user, run_date)
+);
+
+-- 外部内容表：索引只保存倒排表，正文仍只存一份在 papers 中，由触发器保持同步
+CREATE VIRTUAL TABLE IF NOT EXISTS papers_fts USING fts5(
+    title, abstract, summary, content='papers', content_rowid='id'
+);
+CREATE TRIGGER IF NOT EXISTS papers_fts_insert AFTER INSERT ON papers BEGIN
+    INSERT INTO papers_fts (rowid, title, abstract, summary) VALUES (new.id, new.title, new.abstract, new.summary);
+END;
+CREATE TRIGGER IF NOT EXISTS papers_fts_update AFTER UPDATE OF title, abstract, summary ON papers
+WHEN old.title IS NOT new.title OR old.abstract IS NOT new.abstract OR old.summary IS NOT new.summary BEGIN
+    INSERT INTO papers_fts (papers_fts, rowid, title, abstract, summary)
+        VALUES ('delete', old.id, old.title, old.abstract, old.summary);
+    INSERT INTO papers_fts (rowid, title, abstract, summary) VALUES (new.id, new.title, new.abstract, new.summary);
+END;
+CREATE TRIGGER IF NOT EXISTS papers_fts_delete AFTER DELETE ON papers BEGIN
+    INSERT INTO papers_fts (papers_fts, rowid, title, abstract, summary)
+        VALUES ('delete', old.id, old.title, old.abstract, old.summary);
+END;
+
+-- 每个用户每次运行的 LLM 总结各自建索引（无内容表，正文在 results 中）；
+-- 列与 papers_fts 相同，"title:" 等列过滤在两个索引上都可以使用
+CREATE VIRTUAL TABLE IF NOT EXISTS results_fts USING fts5(title, abstract, summary, content='');
+CREATE TRIGGER IF NOT EXISTS results_fts_insert AFTER INSERT ON results BEGIN
+    INSERT INTO results_fts (rowid, title, abstract, summary) VALUES (new.rowid, '', '', COALESCE(new.summary, ''));
+END;
+CREATE TRIGGER IF NOT EXISTS results_fts_delete AFTER DELETE ON results BEGIN
+    INSERT INTO results_fts (results_fts, rowid, title, abstract, summary)
+        VALUES ('delete', old.rowid, '', '', COALESCE(old.summary, ''));
+END;
+CREATE TRIGGER IF NOT EXISTS results_fts_update AFTER UPDATE OF summary ON results
+WHEN old.summary IS NOT new.summary BEGIN
+    INSERT INTO results_fts (results_fts, rowid, title, abstract, summary)
+        VALUES ('delete', old.rowid, '', '', COALESCE(old.summary, ''));
+    INSERT INTO results_fts (rowid, title, abstract, summary) VALUES (new.rowid, '', '', COALESCE(new.summary, ''));
+END;
+
+-- 最近一次交给 LLM 打分时的 MinHash 签名及其 LSH 桶，用于跨运行识别修订版与近重复论文
+CREATE TABLE IF NOT EXISTS signatures (
+    arxiv_id  TEXT PRIMARY KEY,
+    signature BLOB NOT NULL
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS lsh_buckets (
+    band     INTEGER NOT NULL,
+    bucket   INTEGER NOT NULL,
+    arxiv_id TEXT NOT NULL,
+    PRIMARY KEY (band, bucket, arxiv_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS lsh_buckets_paper ON lsh_buckets(arxiv_id);
+"""
+
+
+def today() -> str:
+    return datetime.now().strftime("%Y-%m-%d")
+
+
+class HistoryStore:
+    """
+    Thread-safe wrapper around one SQLite connection. Disabled (every write is a no-op) until
+    open() is called, so the pipeline runs unchanged when nothing is saved.
+    """
+
+    def __init__(self):
+        self.path = None
+        self.conn = None
+        self.lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.conn is not None
+
+    def open(self, path: str = DEFAULT_PATH):
+        if self.conn is not None:
+            if os.path.abspath(path) == os.path.abspath(self.path):
+                return self
+            self.close()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        migrate = self.conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'results'").fetchone() and not (
+            self.conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'results_fts'").fetchone()
+        )
+        self.conn.executescript(SCHEMA)
+        if migrate:
+            self._index_result_summaries()
+        return self
+
+    def _index_result_summaries(self):
+        # 旧版本的库：把已有的总结写入 results_fts，并清空 papers 中只保留了最后一个用户的总结
+        with self.conn:
+            self.conn.execute(
+                """
+                INSERT INTO results_fts (rowid, title, abstract, summary)
+                SELECT rowid, '', '', COALESCE(summary, '') FROM results
+                """
+            )
+            self.conn.execute("UPDATE papers SET summary = '' WHERE summary != ''")
+
+    def close(self):
+        with self.lock:
+            if self.conn is not None:
+                self.conn.close()
+                self.conn = None
+
+    # ------------------------------------------------------------- writes
+
+    def add_papers(self, papers, date: str = None):
+        """Insert newly fetched papers; papers seen before (possibly as another version) are updated."""
+        if not self.enabled or not papers:
+            return
+        date = date or today()
+        with self.lock, self.conn:
+            self.conn.executemany(
+                """
+                INSERT INTO papers (arxiv_id, title, abstract, comments, pdf_url, abstract_url, category,
+                                    first_seen, last_seen)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(arxiv_id) DO UPDATE SET
+                    title = excluded.title,
+                    abstract = excluded.abstract,
+                    comments = excluded.comments,
+                    pdf_url = excluded.pdf_url,
+                    abstract_url = excluded.abstract_url,
+                    last_seen = excluded.last_seen
+                """,
+                [
+                    (
+                        paper.arxiv_id,
+                        paper.title,
+                        paper.abstract,
+                        paper.comments,
+                        paper.pdf_url,
+                        paper.abstract_url,
+                        paper.category,
+                        date,
+                        date,
+                    )
+                    for paper in papers
+                ],
+            )
+
+    def record_results(self, user: str, papers, recommended, model: str = "", date: str = None):
+        """
+        Store the scores of every paper processed for `user`; `recommended` is the ordered list of
+        papers that made it into the digest.
+        """
+        if not self.enabled:
+            return
+        date = date or today()
+        ranks = {paper.arxiv_id: i + 1 for i, paper in enumerate(recommended)}
+        scored = [paper for paper in papers if paper.relevance_score is not None]
+        self.add_papers(scored, date)
+        with self.lock, self.conn:
+            self.conn.execute("DELETE FROM results WHERE user = ? AND run_date = ?", (user, date))
+            self.conn.executemany(
+                """
+                INSERT INTO results (user, run_date, arxiv_id, model, abstract_cn, summary, relevance_score, rank)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                [
+                    (
+                        user,
+                        date,
+                        paper.arxiv_id,
+                        model,
+                        paper.abstract_cn,
+                        paper.summary,
+                        paper.relevance_score,
+                        ranks.get(paper.arxiv_id),
+                    )
+                    for paper in scored
+                ],
+            )
+
+    def record_run(self, user: str, description: str = None, summary_html: str = None, date: str = None):
+        """Store the description and the LLM overview of a digest so it can be re-rendered offline."""
+        if not self.enabled:
+            return
+        with self.lock, self.conn:
+            self.conn.execute(
+                """
+                INSERT INTO runs (user, run_date, description, summary_html) VALUES (?, ?, ?, ?)
+                ON CONFLICT(user, run_date) DO UPDATE SET
+                    description = COALESCE(excluded.description, description),
+                    summary_html = COALESCE(excluded.summary_html, summary_html)
+                """,
+                (user, date or today(), description, summary_html),
+            )
+
+    def add_signatures(self, signatures: dict):
+        """Store {arxiv_id: MinHash signature} of freshly scored papers, replacing older signatures."""
+        if not self.enabled or not signatures:
+            return
+        with self.lock, self.conn:
+            self.conn.executemany(
+                "DELETE FROM lsh_buckets WHERE arxiv_id = ?", [(arxiv_id,) for arxiv_id in signatures]
+            )
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO signatures (arxiv_id, signature) VALUES (?, ?)",
+                [(arxiv_id, dedup.pack(signature)) for arxiv_id, signature in signatures.items()],
+            )
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO lsh_buckets (band, bucket, arxiv_id) VALUES (?, ?, ?)",
+                [
+                    (band, bucket, arxiv_id)
+                    for arxiv_id, signature in signatures.items()
+                    for band, bucket in dedup.bands(signature)
+                ],
+            )
+
+    # -------------------------------------------------------------- reads
+
+    def _chunks(self, ids, size: int = 500):
+        ids = list(ids)
+        for start in range(0, len(ids), size):
+            yield ids[start : start + size]
+
+    def signatures(self, ids) -> dict:
+        found = {}
+        for chunk in self._chunks(ids):
+            rows = self._query(
+                f"SELECT arxiv_id, signature FROM signatures WHERE arxiv_id IN ({','.join('?' * len(chunk))})", chunk
+            )
+            found.update((arxiv_id, dedup.unpack(blob)) for arxiv_id, blob in rows)
+        return found
+
+    def lsh_candidates(self, signatures: dict) -> dict:
+        """{arxiv_id: set of other stored papers sharing at least one LSH bucket with its signature}."""
+        if not signatures:
+            return {}
+        with self.lock:
+            # 用临时表一次性探测所有签名的桶，避免每篇论文单独查询
+            self.conn.execute("CREATE TEMP TABLE IF NOT EXISTS probe (band INTEGER, bucket INTEGER, arxiv_id TEXT)")
+            self.conn.execute("DELETE FROM probe")
+            self.conn.executemany(
+                "INSERT INTO probe (band, bucket, arxiv_id) VALUES (?, ?, ?)",
+                [
+                    (band, bucket, arxiv_id)
+                    for arxiv_id, signature in signatures.items()
+                    for band, bucket in dedup.bands(signature)
+                ],
+            )
+            rows = self.conn.execute(
+                """
+                SELECT DISTINCT p.arxiv_id, l.arxiv_id FROM probe p
+                JOIN lsh_buckets l ON l.band = p.band AND l.bucket = p.bucket
+                WHERE l.arxiv_id != p.arxiv_id
+                """
+            ).fetchall()
+            self.conn.execute("DELETE FROM probe")
+            self.conn.commit()
+        candidates = {}
+        for arxiv_id, other in rows:
+            candidates.setdefault(arxiv_id, set()).add(other)
+        return candidates
+
+    def cached_results(self, user: str, model: str, description: str, ids) -> dict:
+        """Latest result of each paper in `ids` scored for the same user, model and description."""
+        found = {}
+        for chunk in self._chunks(ids):
+            rows = self._query(
+                f"""
+                SELECT r.arxiv_id, r.abstract_cn, r.summary, r.relevance_score, MAX(r.run_date) AS run_date
+                FROM results r JOIN runs u ON u.user = r.user AND u.run_date = r.run_date
+                WHERE r.user = ? AND r.model = ? AND u.description = ?
+                  AND r.arxiv_id IN ({','.join('?' * len(chunk))})
+                GROUP BY r.arxiv_id
+                """,
+                [user, model, description, *chunk],
+            )
+            found.update((row["arxiv_id"], dict(row)) for row in rows)
+        return found
+
+    def _query(self, sql: str, params=()):
+        with self.lock:
+            return self.conn.execute(sql, params).fetchall()
+
+    def search(self, query: str, since: str = None, until: str = None, user: str = None, limit: int = 20):
+        """
+        Full-text search (FTS5 syntax) over titles, abstracts and summaries, best matches first.
+
+        Titles and abstracts are matched in papers_fts, the summaries of every user and run in
+        results_fts (only those of `user` when given), so a query matches when it matches either the
+        paper or one of its summaries.
+        """
+        sql = """
+            WITH hits AS (
+                SELECT rowid AS id, rank FROM papers_fts WHERE papers_fts MATCH :query
+                UNION ALL
+                SELECT p.id, f.rank
+                FROM results_fts f
+                JOIN results r ON r.rowid = f.rowid
+                JOIN papers p ON p.arxiv_id = r.arxiv_id
+                WHERE results_fts MATCH :query AND (:user IS NULL OR r.user = :user)
+            )
+            SELECT p.arxiv_id, p.title, p.first_seen, p.pdf_url,
+                   (SELECT MAX(r.relevance_score) FROM results r
+                     WHERE r.arxiv_id = p.arxiv_id AND (:user IS NULL OR r.user = :user)) AS best_score
+            FROM (SELECT id, MIN(rank) AS rank FROM hits GROUP BY id) h
+            JOIN papers p ON p.id = h.id
+            WHERE (:since IS NULL OR p.first_seen >= :since)
+              AND (:until IS NULL OR p.first_seen <= :until)
+            ORDER BY h.rank
+            LIMIT :limit
+        """
+        params = {"query": query, "since": since, "until": until, "user": user, "limit": limit}
+        return [dict(row) for row in self._query(sql, params)]
+
+    def seen(self, arxiv_id: str, user: str = None):
+        """
+        Every run in which the paper was scored, newest first; rank is None when it was not sent.
+        Any version or form of the ID is accepted ("2510.12345v2", "arXiv:2510.12345").
+        """
+        arxiv_id = dedup.normalize_id(arxiv_id)[0]
+        sql = """
+            SELECT user, run_date, relevance_score, rank FROM results
+            WHERE arxiv_id = ? AND (? IS NULL OR user = ?)
+            ORDER BY run_date DESC
+        """
+        return [dict(row) for row in self._query(sql, (arxiv_id, user, user))]
+
+    def recommended_ids(self, user: str, since: str = None) -> set:
+        """arXiv IDs already sent to `user` (optionally only since a date)."""
+        rows = self._query(
+            "SELECT DISTINCT arxiv_id FROM results WHERE user = ? AND rank IS NOT NULL AND run_date >= ?",
+            (user, since or ""),
+        )
+        return {row[0] for row in rows}
+
+    def recommendations(self, user: str, date: str = None) -> list:
+        """The digest of `user` on `date` as Paper objects in email order."""
+        rows = self._query(
+            """
+            SELECT p.arxiv_id, p.title, p.abstract, p.comments, p.pdf_url, p.abstract_url, p.category,
+                   r.abstract_cn, r.summary, r.relevance_score
+            FROM results r
+            JOIN papers p ON p.arxiv_id = r.arxiv_id
+            WHERE r.user = ? AND r.run_date = ? AND r.rank IS NOT NULL
+            ORDER BY r.rank
+            """,
+            (user, date or today()),
+        )
+        return [
+            Paper(
+                arxiv_id=row["arxiv_id"],
+                title=row["title"],
+                abstract=row["abstract"],
+                comments=row["comments"],
+                pdf_url=row["pdf_url"],
+                abstract_url=row["abstract_url"],
+                category=row["category"],
+                abstract_cn=row["abstract_cn"],
+                summary=row["summary"],
+                relevance_score=row["relevance_score"],
+            )
+            for row in rows
+        ]
+
+    def run(self, user: str, date: str = None) -> dict:
+        rows = self._query("SELECT * FROM runs WHERE user = ? AND run_date = ?", (user, date or today()))
+        return dict(rows[0]) if rows else {}
+
+    def latest_date(self, user: str):
+        rows = self._query("SELECT MAX(run_date) FROM results WHERE user = ?", (user,))
+        return rows[0][0]
+
+    # ---------------------------------------------------------- rendering
+
+    def markdown(self, user: str, date: str = None) -> str:
+        """The weekly markdown archive of one digest, built from the store."""
+        date = date or today()
+        end = datetime.strptime(date, "%Y-%m-%d")
+        # 计算周报起始时间：以当前时间为基准向前推7天，用于生成周报日期范围
+        start = end - timedelta(days=7)
+        lines = [
+            "# Weekly arXiv Papers",
+            f"## Date: {start.strftime('%Y-%m-%d')} - {date}",
+            f"## Description: {self.run(user, date).get('description') or ''}",
+            "## Papers:",
+        ]
+        for i, paper in enumerate(self.recommendations(user, date)):
+            lines += [
+                f"### {i + 1}. {paper.title}",
+                "#### Abstract:",
+                f"{paper.abstract_cn}",
+                "#### Summary:",
+                f"{paper.summary}",
+                f"#### Relevance Score: {paper.relevance_score}",
+                f"#### PDF URL: {paper.pdf_url}",
+                "",
+            ]
+        return "\n".join(lines) + "\n"
+
+    def html(self, user: str, date: str = None) -> str:
+        """Re-render the email of one digest from the store, without any LLM or network call."""
+        from util.construct_email import framework, get_block_html, get_empty_html, get_stars, render_html
+
+        papers = self.recommendations(user, date)
+        if not papers:
+            return framework.replace("__CONTENT__", get_empty_html())
+        blocks = [
+            get_block_html(f"{i + 1}. {p.title}", get_stars(p.relevance_score), p.arxiv_id, p.summary, p.pdf_url)
+            for i, p in enumerate(papers)
+        ]
+        html, _ = render_html(self.run(user, date).get("summary_html") or "", blocks)
+        return html
+
+
+history = HistoryStore()
+
+
+def fts_query(text: str) -> str:
+    """
+    Turn plain search terms into an FTS5 query: every whitespace-separated term is quoted, so
+    "self-supervised vision-language" matches both hyphenated phrases instead of failing as FTS5
+    syntax. Terms must all match; a trailing * keeps prefix matching ("diffus*").
+    """
+    terms = []
+    for term in text.split():
+        prefix = term.endswith("*") and len(term) > 1
+        term = term.rstrip("*") if prefix else term
+        terms.append('"{}"'.format(term.replace('"', '""')) + ("*" if prefix else ""))
+    return " ".join(terms)
+
+
+def main(argv=None):
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", default=DEFAULT_PATH, help="Path of the history database.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    search = commands.add_parser("search", help="Full-text search over titles, abstracts and summaries.")
+    search.add_argument("query", help='Search terms, e.g. "self-supervised diffusion*"; all terms must match.')
+    search.add_argument(
+        "--raw", action="store_true", help='Pass the query as FTS5 syntax, e.g. "diffusion OR title:transformer".'
+    )
+    search.add_argument("--since", help="First seen on or after this date (YYYY-MM-DD).")
+    search.add_argument("--until", help="First seen on or before this date (YYYY-MM-DD).")
+    search.add_argument("--user", help="Match only this user's summaries and show the best score given for them.")
+    search.add_argument("--limit", type=int, default=20)
+
+    seen = commands.add_parser("seen", help="Show when a paper was scored and recommended.")
+    seen.add_argument("arxiv_id", help="With or without version suffix, e.g. 2510.12345v2.")
+    seen.add_argument("--user")
+
+    render = commands.add_parser("render", help="Re-render a past digest from the store.")
+    render.add_argument("--user", required=True)
+    render.add_argument("--date", help="Defaults to the latest run of the user.")
+    render.add_argument("--format", choices=["markdown", "html"], default="markdown")
+    render.add_argument("-o", "--output", help="Write to this file instead of stdout.")
+
+    args = parser.parse_args(argv)
+    if not os.path.exists(args.db):
+        parser.error(f"History database {args.db} does not exist.")
+    store = HistoryStore().open(args.db)
+
+    start = time.perf_counter()
+    if args.command == "search":
+        query = args.query if args.raw else fts_query(args.query)
+        try:
+            rows = store.search(query, args.since, args.until, args.user, args.limit)
+        except sqlite3.OperationalError as e:
+            parser.error(f"Invalid search query {query!r}: {e}. Quote phrases with special characters, e.g. '\"vision-language\"'.")
+        for row in rows:
+            score = "-" if row["best_score"] is None else f"{row['best_score']:.1f}"
+            print(f"{row['first_seen']}  {row['arxiv_id']:<12}{score:>5}  {row['title']}")
+        print(f"{len(rows)} result(s) in {(time.perf_counter() - start) * 1000:.1f} ms")
+    elif args.command == "seen":
+        rows = store.seen(args.arxiv_id, args.user)
+        if not rows:
+            print(f"{args.arxiv_id} has never been scored.")
+        for row in rows:
+            status = f"recommended #{row['rank']}" if row["rank"] else "not recommended"
+            print(f"{row['run_date']}  {row['user']:<12}score {row['relevance_score']}  {status}")
+    else:
+        date = args.date or store.latest_date(args.user)
+        if date is None:
+            parser.error(f"No runs stored for user {args.user}.")
+        content = store.markdown(args.user, date) if args.format == "markdown" else store.html(args.user, date)
+        if args.output:
+            with open(args.output, "w", encoding="utf-8") as f:
+                f.write(content)
+            print(f"Digest of {args.user} on {date} written to {args.output}")
+        else:
+            print(content)
+    store.close()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
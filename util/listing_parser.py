@@ -0,0 +1,151 @@
+"""
+Streaming parsers for arXiv listing and abstract pages.
+
+Built on the standard library's event-driven html.parser.HTMLParser: entries are yielded as soon as
+their </dd> is seen, so no DOM is ever built and a consumer that stops early (max_results reached)
+also stops the parsing.
+"""
+
+from html.parser import HTMLParser
+
+CHUNK_SIZE = 64 * 1024
+
+
+class _ListingParser(HTMLParser):
+    """
+    Collects one dict per <dt>/<dd> pair inside <dl id="articles">:
+    abs_url / pdf_url (site-relative hrefs), title, comments and, for /new listings, abstract.
+    """
+
+    def __init__(self, max_lists: int = None):
+        super().__init__(convert_charrefs=True)
+        self.max_lists = max_lists
+        self.entries = []
+        self.in_articles = False
+        self.lists_closed = 0
+        self.current = None
+        # 当前正在收集文本的字段，以及该字段所在元素的嵌套深度
+        self.field = None
+        self.field_tag = None
+        self.field_depth = 0
+        self.buffer = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag == "dl":
+            self.in_articles = dict(attrs).get("id") == "articles" and (
+                self.max_lists is None or self.lists_closed < self.max_lists
+            )
+            return
+        if not self.in_articles:
+            return
+
+        if self.field is not None:
+            if tag == self.field_tag:
+                self.field_depth += 1
+            return
+
+        if tag == "dt":
+            self.current = {}
+        elif self.current is None:
+            return
+        elif tag == "a":
+            attrs = dict(attrs)
+            if attrs.get("title") == "Abstract":
+                self.current["abs_url"] = attrs.get("href")
+            elif attrs.get("title") == "Download PDF":
+                self.current["pdf_url"] = attrs.get("href")
+        elif tag in ("div", "p"):
+            classes = (dict(attrs).get("class") or "").split()
+            if tag == "div" and "list-title" in classes:
+                self._start_field("title", tag)
+            elif tag == "div" and "list-comments" in classes:
+                self._start_field("comments", tag)
+            elif tag == "p" and "mathjax" in classes:
+                self._start_field("abstract", tag)
+
+    def handle_endtag(self, tag):
+        if not self.in_articles:
+            return
+        if self.field is not None:
+            if tag == self.field_tag:
+                self.field_depth -= 1
+                if self.field_depth == 0:
+                    self.current[self.field] = "".join(self.buffer).strip()
+                    self.field = None
+            return
+        if tag == "dd" and self.current is not None:
+            self.entries.append(self.current)
+            self.current = None
+        elif tag == "dl":
+            self.in_articles = False
+            self.lists_closed += 1
+
+    def handle_data(self, data):
+        if self.field is not None:
+            self.buffer.append(data)
+
+    def _start_field(self, field, tag):
+        self.field = field
+        self.field_tag = tag
+        self.field_depth = 1
+        self.buffer = []
+
+
+def iter_listing(html: str, first_list_only: bool = False):
+    """
+    Yield the entries of an arXiv listing page one at a time.
+
+    Each entry has the same stripped text as the BeautifulSoup path: `title` and `comments` (still
+    carrying their descriptors), plus `abstract` only when the page shows it inline. With
+    first_list_only, parsing stops at the end of the first <dl id="articles">.
+    """
+    parser = _ListingParser(max_lists=1 if first_list_only else None)
+    for start in range(0, len(html), CHUNK_SIZE):
+        parser.feed(html[start : start + CHUNK_SIZE])
+        if parser.entries:
+            yield from parser.entries
+            parser.entries = []
+        if first_list_only and parser.lists_closed:
+            return
+    parser.close()
+    yield from parser.entries
+
+
+class _AbstractParser(HTMLParser):
+    """Collects the text of <blockquote class="abstract mathjax"> and stops caring after it."""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.depth = 0
+        self.buffer = []
+        self.done = False
+
+    def handle_starttag(self, tag, attrs):
+        if tag != "blockquote" or self.done:
+            return
+        if self.depth:
+            self.depth += 1
+        elif {"abstract", "mathjax"} <= set((dict(attrs).get("class") or "").split()):
+            self.depth = 1
+
+    def handle_endtag(self, tag):
+        if tag == "blockquote" and self.depth:
+            self.depth -= 1
+            if self.depth == 0:
+                self.done = True
+
+    def handle_data(self, data):
+        if self.depth:
+            self.buffer.append(data)
+
+
+def parse_abstract(html: str):
+    """Return the abstract text of an arXiv /abs/ page (without "Abstract:"), or None if absent."""
+    parser = _AbstractParser()
+    for start in range(0, len(html), CHUNK_SIZE):
+        parser.feed(html[start : start + CHUNK_SIZE])
+        if parser.done:
+            break
+    if not parser.buffer:
+        return None
+    return "".join(parser.buffer).strip().replace("Abstract:", "").strip()
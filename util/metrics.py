@@ -0,0 +1,152 @@
+"""
+Per-stage timers and counters, exported as a Prometheus textfile and a JSON run report.
+"""
+
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# 延迟直方图的桶（秒）
+BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+
+def _label_key(labels: dict) -> tuple:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _format_labels(key: tuple, extra: dict = None) -> str:
+    pairs = list(key) + sorted((extra or {}).items())
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in pairs) + "}"
+
+
+def quantile(samples: list, q: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, int(round(q * (len(ordered) - 1)))))
+    return ordered[index]
+
+
+class Metrics:
+    """
+    Thread-safe registry of counters and duration histograms.
+
+    Every metric is identified by a name plus a set of labels (user, provider, category, ...).
+    Histograms keep their raw samples so that the JSON report can give exact quantiles.
+    """
+
+    def __init__(self, prefix: str = "arxiv_daily"):
+        self.prefix = prefix
+        self.counters = {}
+        self.histograms = {}
+        self.lock = threading.Lock()
+        self.started = time.time()
+
+    def inc(self, name: str, value: float = 1, **labels):
+        key = (name, _label_key(labels))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name: str, seconds: float, **labels):
+        key = (name, _label_key(labels))
+        with self.lock:
+            self.histograms.setdefault(key, []).append(seconds)
+
+    def reset(self):
+        """Forget every counter and sample, e.g. after a long-running process saved its daily report."""
+        with self.lock:
+            self.counters.clear()
+            self.histograms.clear()
+            self.started = time.time()
+
+    @contextmanager
+    def timer(self, stage: str, **labels):
+        """Time a stage; failures are counted under stage_errors_total."""
+        start = time.perf_counter()
+        try:
+            yield
+        except Exception:
+            self.inc("stage_errors_total", stage=stage, **labels)
+            raise
+        finally:
+            self.observe("stage_duration_seconds", time.perf_counter() - start, stage=stage, **labels)
+
+    def report(self) -> dict:
+        with self.lock:
+            counters = [
+                {"name": name, "labels": dict(key), "value": value}
+                for (name, key), value in sorted(self.counters.items())
+            ]
+            histograms = []
+            for (name, key), samples in sorted(self.histograms.items()):
+                histograms.append(
+                    {
+                        "name": name,
+                        "labels": dict(key),
+                        "count": len(samples),
+                        "sum": sum(samples),
+                        "max": max(samples),
+                        "p50": quantile(samples, 0.5),
+                        "p95": quantile(samples, 0.95),
+                        "p99": quantile(samples, 0.99),
+                    }
+                )
+        return {
+            "started": self.started,
+            "finished": time.time(),
+            "counters": counters,
+            "histograms": histograms,
+        }
+
+    def to_prometheus(self) -> str:
+        lines = []
+        with self.lock:
+            counter_names = sorted({name for name, _ in self.counters})
+            for name in counter_names:
+                metric = f"{self.prefix}_{name}"
+                lines.append(f"# TYPE {metric} counter")
+                for (n, key), value in sorted(self.counters.items()):
+                    if n == name:
+                        lines.append(f"{metric}{_format_labels(key)} {value}")
+
+            histogram_names = sorted({name for name, _ in self.histograms})
+            for name in histogram_names:
+                metric = f"{self.prefix}_{name}"
+                lines.append(f"# TYPE {metric} histogram")
+                for (n, key), samples in sorted(self.histograms.items()):
+                    if n != name:
+                        continue
+                    for bucket in BUCKETS:
+                        count = sum(1 for s in samples if s <= bucket)
+                        lines.append(f"{metric}_bucket{_format_labels(key, {'le': str(bucket)})} {count}")
+                    lines.append(f"{metric}_bucket{_format_labels(key, {'le': '+Inf'})} {len(samples)}")
+                    lines.append(f"{metric}_sum{_format_labels(key)} {sum(samples)}")
+                    lines.append(f"{metric}_count{_format_labels(key)} {len(samples)}")
+
+        lines.append(f"# TYPE {self.prefix}_last_run_timestamp_seconds gauge")
+        lines.append(f"{self.prefix}_last_run_timestamp_seconds {time.time()}")
+        return "\n".join(lines) + "\n"
+
+    def save(self, metrics_dir: str, date: str):
+        """
+        Write <prefix>.prom (for the node_exporter textfile collector) and run_report-<date>.json.
+        The .prom file is written atomically so the collector never reads a partial file.
+        """
+        os.makedirs(metrics_dir, exist_ok=True)
+        prom_path = os.path.join(metrics_dir, f"{self.prefix}.prom")
+        tmp_path = prom_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(self.to_prometheus())
+        os.replace(tmp_path, prom_path)
+
+        report_path = os.path.join(metrics_dir, f"run_report-{date}.json")
+        with open(report_path, "w", encoding="utf-8") as f:
+            json.dump(self.report(), f, ensure_ascii=False, indent=2)
+        return prom_path, report_path
+
+
+metrics = Metrics()
@@ -0,0 +1,24 @@
+"""
+Compact record for an arXiv paper, shared by the crawler, ArxivDaily and the renderer.
+"""
+
+from dataclasses import asdict, dataclass
+
+
+@dataclass(slots=True)
+class Paper:
+    arxiv_id: str
+    title: str
+    abstract: str
+    comments: str
+    pdf_url: str
+    abstract_url: str
+    # 首次抓取到该论文的类别（已 intern，多篇论文共享同一个字符串对象）
+    category: str = ""
+    # 以下字段在 LLM 打分成功后填写
+    abstract_cn: str = ""
+    summary: str = ""
+    relevance_score: float = None
+
+    def to_dict(self) -> dict:
+        return asdict(self)
@@ -0,0 +1,196 @@
+"""
+Opt-in CPU (cProfile) and memory (tracemalloc) profiling, scoped per pipeline stage.
+"""
+
+import cProfile
+import io
+import os
+import pstats
+import sys
+import threading
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+
+from loguru import logger
+
+_DISABLED = nullcontext()
+# Python 3.12 起 cProfile 基于 sys.monitoring：整个进程同时只能有一个活动的 Profile，且它覆盖所有线程
+PROCESS_WIDE_CPU = sys.version_info >= (3, 12)
+
+
+class _Frame:
+    """One active stage of one thread."""
+
+    __slots__ = ("name", "prof", "mark", "allocated", "overlapped")
+
+    def __init__(self, name: str, prof, mark: int):
+        self.name = name
+        self.prof = prof
+        self.mark = mark
+        self.allocated = 0
+        self.overlapped = False
+
+
+class Profiler:
+    """
+    Collects one merged pstats.Stats per stage (fetch, parse, infer, render, send).
+
+    Stages may be nested: entering an inner stage pauses the outer one in the same thread,
+    so every function call and allocation is attributed to exactly one stage. On Python < 3.12
+    profiles are per thread, which means worker-thread stages (e.g. infer) are captured as well,
+    including the time they spend waiting on locks. On Python 3.12+ only one profiler can be active
+    in the process, so a single process-wide CPU profile ("all") is written instead.
+
+    tracemalloc only has a process-wide counter, so the net allocation of a stage is exact only
+    when no stage of another thread ran at the same time; overlapping calls are counted separately.
+    When disabled, stage() returns a shared no-op context.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.cpu = False
+        self.memory = False
+        self.output_dir = None
+        self.stats = {}
+        self.allocations = {}
+        self.peak_snapshot = None
+        self.peak_size = 0
+        self.process_profile = None
+        self.stacks = {}
+        self.lock = threading.Lock()
+        self.local = threading.local()
+
+    def enable(self, output_dir: str, cpu: bool = True, memory: bool = True):
+        self.enabled = cpu or memory
+        self.cpu = cpu
+        self.memory = memory
+        self.output_dir = output_dir
+        if cpu and PROCESS_WIDE_CPU:
+            logger.warning(
+                f"Python {sys.version_info[0]}.{sys.version_info[1]} allows only one active profiler: "
+                "CPU time is profiled for the whole process (profile-all) instead of per stage."
+            )
+            self.process_profile = cProfile.Profile()
+            try:
+                self.process_profile.enable()
+            except ValueError as e:
+                # 调试器、coverage 等工具已占用 profiler
+                logger.warning(f"CPU profiling disabled: {e}")
+                self.process_profile = None
+                self.cpu = False
+        if memory and not tracemalloc.is_tracing():
+            tracemalloc.start(25)
+        self.enabled = self.cpu or self.memory
+
+    def stage(self, name: str):
+        if not self.enabled:
+            return _DISABLED
+        return self._stage(name)
+
+    def _traced(self) -> int:
+        return tracemalloc.get_traced_memory()[0] if self.memory else 0
+
+    @contextmanager
+    def _stage(self, name: str):
+        stack = self.local.__dict__.get("stack")
+        if stack is None:
+            stack = self.local.stack = []
+            with self.lock:
+                self.stacks[threading.get_ident()] = stack
+        now = self._traced()
+        if stack:
+            outer = stack[-1]
+            if outer.prof is not None:
+                outer.prof.disable()
+            outer.allocated += now - outer.mark
+        frame = _Frame(name, cProfile.Profile() if self.cpu and not PROCESS_WIDE_CPU else None, now)
+        with self.lock:
+            # 其他线程正在某个阶段中：进程级的分配计数同时包含双方的分配，两边都不再精确
+            for ident, other in self.stacks.items():
+                if other and ident != threading.get_ident():
+                    frame.overlapped = True
+                    for active in other:
+                        active.overlapped = True
+            stack.append(frame)
+        if frame.prof is not None:
+            frame.prof.enable()
+        try:
+            yield
+        finally:
+            if frame.prof is not None:
+                frame.prof.disable()
+            current = self._traced()
+            frame.allocated += current - frame.mark
+            with self.lock:
+                stack.pop()
+                if not stack:
+                    # 线程池的线程会不断更替，离开最外层阶段时注销，避免常驻进程中累积
+                    del self.stacks[threading.get_ident()]
+                    del self.local.stack
+                # 只在内存显著增长时拍快照，记录峰值附近的分配位置
+                if self.memory and current > self.peak_size * 1.1:
+                    self.peak_size = current
+                    self.peak_snapshot = tracemalloc.take_snapshot()
+                if frame.prof is not None:
+                    if name in self.stats:
+                        self.stats[name].add(frame.prof)
+                    else:
+                        self.stats[name] = pstats.Stats(frame.prof)
+                calls, total, overlapped = self.allocations.get(name, (0, 0, 0))
+                if frame.overlapped:
+                    overlapped += 1
+                else:
+                    calls += 1
+                    total += frame.allocated
+                self.allocations[name] = (calls, total, overlapped)
+            if stack:
+                outer = stack[-1]
+                outer.mark = self._traced()
+                if outer.prof is not None:
+                    outer.prof.enable()
+
+    def dump(self, top: int = 30):
+        """
+        Write profile-<stage>.pstats (loadable by snakeviz / flameprof / gprof2dot) plus a
+        readable profile-<stage>.txt, and profile-memory.txt with the top allocation sites
+        as of the largest heap seen at a stage boundary.
+        """
+        if not self.enabled:
+            return []
+        os.makedirs(self.output_dir, exist_ok=True)
+        written = []
+        with self.lock:
+            profiles = dict(self.stats)
+            if self.process_profile is not None:
+                self.process_profile.disable()
+                profiles["all"] = pstats.Stats(self.process_profile)
+            for name, stats in profiles.items():
+                path = os.path.join(self.output_dir, f"profile-{name}.pstats")
+                stats.dump_stats(path)
+                stream = io.StringIO()
+                pstats.Stats(path, stream=stream).sort_stats("cumulative").print_stats(top)
+                with open(os.path.join(self.output_dir, f"profile-{name}.txt"), "w", encoding="utf-8") as f:
+                    f.write(stream.getvalue())
+                written.append(path)
+
+            if self.memory:
+                snapshot = self.peak_snapshot or tracemalloc.take_snapshot()
+                current, peak = tracemalloc.get_traced_memory()
+                path = os.path.join(self.output_dir, "profile-memory.txt")
+                with open(path, "w", encoding="utf-8") as f:
+                    f.write(f"Current traced memory: {current / 1024 / 1024:.1f} MiB\n")
+                    f.write(f"Peak traced memory: {peak / 1024 / 1024:.1f} MiB\n\n")
+                    f.write("Net allocation per stage (calls that ran while no other thread was in a stage):\n")
+                    for name, (calls, total, overlapped) in sorted(self.allocations.items()):
+                        line = f"  {name}: {calls} calls, {total / 1024:.1f} KiB"
+                        if overlapped:
+                            line += f"; {overlapped} calls overlapped other threads and are not counted"
+                        f.write(line + "\n")
+                    f.write(f"\nTop {top} allocation sites (near peak, {self.peak_size / 1024 / 1024:.1f} MiB):\n")
+                    for stat in snapshot.statistics("lineno")[:top]:
+                        f.write(f"  {stat}\n")
+                written.append(path)
+        return written
+
+
+profiler = Profiler()
@@ -0,0 +1,74 @@
+"""
+Process-wide rate limiters shared by every user pipeline: one for arXiv and one per LLM endpoint.
+"""
+
+import math
+import threading
+import time
+
+from util.metrics import metrics
+
+ARXIV = "arxiv"
+
+
+def llm_limiter(provider: str, base_url: str = None) -> str:
+    """Limiter name of an LLM endpoint; users configured with the same endpoint share it."""
+    return f"llm:{base_url or provider.lower()}"
+
+
+class RateLimiter:
+    """
+    Token bucket: `rate` requests per second with bursts of up to `burst`. Callers reserve a token
+    under the lock and sleep outside it, so waiting threads are served in arrival order.
+    """
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.tokens = float(self.burst)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self) -> float:
+        """Take one token, sleeping until it is available; returns the time waited in seconds."""
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+        if wait:
+            time.sleep(wait)
+        return wait
+
+
+class RateLimits:
+    """Named limiters; acquiring a name that has no limit configured returns immediately."""
+
+    def __init__(self):
+        self.limiters = {}
+        self.lock = threading.Lock()
+
+    def configure(self, name: str, rate: float = None, burst: int = None):
+        """Limit `name` to `rate` requests per second (None or 0 removes the limit)."""
+        with self.lock:
+            if not rate:
+                self.limiters.pop(name, None)
+                return
+            burst = burst or max(1, math.ceil(rate))
+            current = self.limiters.get(name)
+            # 配置未变化时保留原有的令牌桶（常驻模式重新加载配置时不会重置状态）
+            if current is None or (current.rate, current.burst) != (rate, burst):
+                self.limiters[name] = RateLimiter(rate, burst)
+
+    def acquire(self, name: str) -> float:
+        limiter = self.limiters.get(name)
+        if limiter is None:
+            return 0.0
+        wait = limiter.acquire()
+        if wait:
+            metrics.observe("rate_limit_wait_seconds", wait, limiter=name)
+        return wait
+
+
+rate_limits = RateLimits()
@@ -1,59 +1,183 @@
 """
-Use requests and BeautifulSoup to get yesterday's arXiv papers.
+Use requests and a streaming HTML parser (or BeautifulSoup) to get yesterday's arXiv papers.
 """
 
-import requests
-from bs4 import BeautifulSoup
+import sys
+import threading
 import time
 
-def get_arxiv_papers_from_date(category: str = "physics.optics", max_results: int = 10, days: str = "pastweek"):  
+from util.metrics import metrics
+from util.profiling import profiler
+from util.cassette import cassette
+from util.dedup import normalize_id
+from util.listing_parser import iter_listing, parse_abstract
+from util.paper import Paper
+from util.ratelimit import ARXIV, rate_limits
+
+# arXiv 站点地址与请求间隔开关，基准测试时会指向本地的假服务器并关闭等待
+ARXIV_URL = "https://arxiv.org"
+THROTTLE = True
+# 页面解析后端："stream" 为逐条产出的流式解析器，"bs4" 为原先基于 BeautifulSoup 的完整 DOM 解析
+PARSER = "stream"
+# 单次请求的超时时间（秒），避免常驻进程被卡住的连接挂起
+TIMEOUT = 60
+
+
+def polite_sleep(seconds: float):
+    """Sleep between requests to avoid being blocked by arXiv, unless throttling is off or replaying."""
+    if THROTTLE and not cassette.replaying:
+        time.sleep(seconds)
+
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def session():
+    """Shared keep-alive requests.Session for arXiv, created on first use and reused by every run."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            # requests 只在真正访问网络时才导入（回放模式下不需要）
+            import requests
+            from requests.adapters import HTTPAdapter
+
+            _session = requests.Session()
+            _session.mount("http://", HTTPAdapter(pool_maxsize=16))
+            _session.mount("https://", HTTPAdapter(pool_maxsize=16))
+        return _session
+
+
+def _get(url: str, stage: str, category: str, labels: dict = None) -> str:
+    # 所有用户共享同一个 arXiv 限速器，并发运行时总请求速率不变
+    if THROTTLE and not cassette.replaying:
+        rate_limits.acquire(ARXIV)
+    with metrics.timer(stage, category=category, **(labels or {})), profiler.stage("fetch"):
+        return cassette.http(url, lambda: session().get(url, timeout=TIMEOUT).text)
+
+
+def _iter_listing_bs4(html: str, first_list_only: bool = False):
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(html, "html.parser")
+    # 在 arXiv 的论文列表页面 (如 /list/cs/new), 论文按日期分组。
+    # 每个日期分组都包含在一个 <dl id="articles"> 标签中。
+    dl_elements = soup.find_all("dl", id="articles")
+    for dl in dl_elements[:1] if first_list_only else dl_elements:
+        # 在一个 <dl> 标签内，每篇论文由一对 <dt> 和 <dd> 标签表示。
+        # <dt> 标签包含论文的链接（如摘要页、PDF）。
+        # <dd> 标签包含论文的详细信息（如标题、作者、摘要内容）。
+        # `entries` 列表是扁平的: [dt1, dd1, dt2, dd2, ...]，以2为步长成对处理。
+        entries = dl.find_all(["dt", "dd"])
+        for i in range(0, len(entries), 2):
+            if i + 1 >= len(entries):
+                break
+            entry = {
+                # HTML 示例: <a href="/abs/2508.06215" title="Abstract">arXiv:2508.06215</a>
+                "abs_url": entries[i].find("a", title="Abstract")["href"],
+                # HTML 示例: <a href="/pdf/2508.06215" title="Download PDF">pdf</a>
+                "pdf_url": entries[i].find("a", title="Download PDF")["href"],
+            }
+            # HTML 示例: <div class="list-title"><span class="descriptor">Title:</span> Some Paper Title</div>
+            title_tag = entries[i + 1].find("div", class_="list-title")
+            if title_tag:
+                entry["title"] = title_tag.text.strip()
+            # HTML 示例: <div class="list-comments mathjax">10 pages, 5 figures</div>
+            comments_tag = entries[i + 1].find("div", class_="list-comments")
+            if comments_tag:
+                entry["comments"] = comments_tag.text.strip()
+            abstract_tag = entries[i + 1].find("p", class_="mathjax")
+            if abstract_tag:
+                entry["abstract"] = abstract_tag.text.strip()
+            yield entry
 
-    if days == "yesterday": # 昨天
-        url = f"https://arxiv.org/list/{category}/new?skip=0&show={max_results}"
-        time.sleep(1)
-        response = requests.get(url)
 
-        soup = BeautifulSoup(response.text, "html.parser")
+def _parse_abstract_bs4(html: str):
+    from bs4 import BeautifulSoup
 
-        try:
-            entries = soup.find_all("dl", id="articles")[0].find_all(["dt", "dd"])
-        except Exception as e:
-            return []
+    abs_soup = BeautifulSoup(html, "html.parser")
+    # HTML 示例: <blockquote class="abstract mathjax">Selective spatial control of chemical reactions...</blockquote>
+    abstract_tag = abs_soup.find("blockquote", class_="abstract mathjax")
+    return abstract_tag.text.strip().replace("Abstract:", "").strip() if abstract_tag else None
 
-        papers = []
-        for i in range(0, len(entries), 2):
-            title_tag = entries[i + 1].find("div", class_="list-title")
-            title = (
-                title_tag.text.strip().replace("Title:", "").strip()
-                if title_tag
-                else "No title available"
-            )
 
-            abs_url = "https://arxiv.org" + entries[i].find("a", title="Abstract")["href"]
+def listing_entries(html: str, first_list_only: bool = False):
+    """Yield the raw <dt>/<dd> entries of a listing page with the configured PARSER."""
+    if PARSER == "bs4":
+        return _iter_listing_bs4(html, first_list_only)
+    return iter_listing(html, first_list_only)
 
-            pdf_url = entries[i].find("a", title="Download PDF")["href"]
-            pdf_url = "https://arxiv.org" + pdf_url
 
-            abstract_tag = entries[i + 1].find("p", class_="mathjax")
-            abstract = (
-                abstract_tag.text.strip() if abstract_tag else "No abstract available"
-            )
+def abstract_from_page(html: str):
+    """Return the abstract of an /abs/ page with the configured PARSER, or None."""
+    if PARSER == "bs4":
+        return _parse_abstract_bs4(html)
+    return parse_abstract(html)
+
+
+def _entry_id(entry: dict) -> str:
+    # 去掉版本号（v2、v3 ...），同一论文的不同版本共用一个 ID
+    return normalize_id(entry["pdf_url"].split("/")[-1])[0]
 
-            comments_tag = entries[i + 1].find("div", class_="list-comments")
-            comments = (
-                comments_tag.text.strip() if comments_tag else "No comments available"
-            )
-
-            paper_info = {
-                "title": title,
-                "arXiv_id": pdf_url.split("/")[-1],
-                "abstract": abstract,
-                "comments": comments,
-                "pdf_url": pdf_url,
-                "abstract_url": abs_url,
-            }
 
-            papers.append(paper_info)
+def _entry_title(entry: dict) -> str:
+    title = entry.get("title")
+    return title.replace("Title:", "").strip() if title else "No title available"
+
+
+def _revised(paper: Paper, entry: dict) -> bool:
+    """Whether the listing shows a cached paper with another version (PDF link) or title."""
+    return paper.pdf_url != ARXIV_URL + entry["pdf_url"] or paper.title != _entry_title(entry)
+
+
+def _paper_info(entry: dict, abstract: str, category: str) -> Paper:
+    return Paper(
+        arxiv_id=_entry_id(entry),
+        title=_entry_title(entry),
+        abstract=abstract or "No abstract available",
+        comments=entry.get("comments") or "No comments available",
+        pdf_url=ARXIV_URL + entry["pdf_url"],
+        abstract_url=ARXIV_URL + entry["abs_url"],
+        category=category,
+    )
+
+
+def get_arxiv_papers_from_date(
+    category: str = "physics.optics",
+    max_results: int = 10,
+    days: str = "pastweek",
+    seen: dict = None,
+    labels: dict = None,
+):
+    """
+    Return the papers listed for `category` as Paper records.
+
+    seen: optional {arxiv_id: Paper} shared across categories (and across runs in daemon mode). A
+    paper that is already in it is reused without fetching its abstract page again, unless the
+    listing shows a new version or title; new and revised papers are stored in it.
+    labels: extra metric labels of the fetch_listing / fetch_abstract timers, e.g. user and provider.
+    """
+    category = sys.intern(category)
+    if seen is None:
+        seen = {}
+
+    if days == "yesterday": # 昨天
+        url = f"{ARXIV_URL}/list/{category}/new?skip=0&show={max_results}"
+        polite_sleep(1)
+        response = _get(url, "fetch_listing", category, labels)
+
+        papers = []
+        try:
+            with profiler.stage("parse"):
+                # 只取第一个列表（当天的新投稿），摘要直接内嵌在列表页中
+                for entry in listing_entries(response, first_list_only=True):
+                    paper_id = _entry_id(entry)
+                    paper = seen.get(paper_id)
+                    if paper is None or _revised(paper, entry):
+                        paper = seen[paper_id] = _paper_info(entry, entry.get("abstract"), category)
+                    papers.append(paper)
+        except Exception as e:
+            return papers
 
         return papers
         
@@ -68,104 +192,46 @@ def get_arxiv_papers_from_date(category: str = "physics.optics", max_results: in
             # {category}: 论文的类别，例如 'cs.CV' 或 'physics.optics'。
             # skip={skip}: 用于分页，跳过已经获取的论文数量。
             # show={batch_size}: 指定每页显示的最大论文数量。
-            url = f"https://arxiv.org/list/{category}/pastweek?skip={skip}&show={batch_size}"
+            url = f"{ARXIV_URL}/list/{category}/pastweek?skip={skip}&show={batch_size}"
             # 发送HTTP GET请求到构建好的URL，获取页面内容。
-            time.sleep(1)
-            response = requests.get(url)
-            
-            # 使用BeautifulSoup库和Python内置的html.parser来解析返回的HTML文本。
-            soup = BeautifulSoup(response.text, "html.parser")
+            polite_sleep(1)
+            response = _get(url, "fetch_listing", category, labels)
             
             # 初始化当前页面上找到的论文数量的计数器。
             papers_on_this_page = 0
             # 初始化一个标志，用于判断是否已经收集到足够数量的论文。
             limit_reached = False
             try:
-                # 获取所有dl元素，每个都可能包含论文
-                # 在 arXiv 的论文列表页面 (如 /list/cs/new), 论文按日期分组。
-                # 每个日期分组都包含在一个 <dl> 标签中。
-                # 这行代码找到页面上所有的 <dl> 标签，以便处理所有日期的论文。
-                dl_elements = soup.find_all("dl", id="articles")
-                
-                # 遍历每个日期的论文列表（即每个 <dl> 标签）。
-                for dl in dl_elements:
-                    # 在一个 <dl> 标签内，每篇论文由一对 <dt> 和 <dd> 标签表示。
-                    # <dt> 标签包含论文的链接（如摘要页、PDF）。
-                    # <dd> 标签包含论文的详细信息（如标题、作者、摘要内容）。
-                    # 这行代码按顺序找到所有的 <dt> 和 <dd> 标签。
-                    entries = dl.find_all(["dt", "dd"])
-                    papers_on_this_page += len(entries)
-                    
-                    # `entries` 列表是扁平的: [dt1, dd1, dt2, dd2, ...]。
-                    # 我们以2为步长进行迭代，以便成对处理 (dt, dd)。
-                    for i in range(0, len(entries), 2):
-                        if i + 1 >= len(entries):
-                            break
-                            
-                        # <dd> 标签 (位于索引 i + 1) 包含论文的详细信息。
-                        # 标题位于一个 class="list-title" 的 <div> 中。
-                        # HTML 示例: <div class="list-title"><span class="descriptor">Title:</span> Some Paper Title</div>
-                        title_tag = entries[i + 1].find("div", class_="list-title")
-                        title = (
-                            title_tag.text.strip().replace("Title:", "").strip()
-                            if title_tag
-                            else "No title available"
-                        )
-
-                        # <dt> 标签 (位于索引 i) 包含论文的链接。
-                        # 摘要页链接是一个 title="Abstract" 的 <a> 标签。
-                        # HTML 示例: <a href="/abs/2508.06215" title="Abstract">arXiv:2508.06215</a>
-                        abs_url = "https://arxiv.org" + entries[i].find("a", title="Abstract")["href"]
-
-                        # PDF 链接是一个 title="Download PDF" 的 <a> 标签。
-                        # HTML 示例: <a href="/pdf/2508.06215" title="Download PDF">pdf</a>
-                        pdf_url = entries[i].find("a", title="Download PDF")["href"]
-                        pdf_url = "https://arxiv.org" + pdf_url
-                        # 发送HTTP GET请求到构建好的URL，获取页面内容。
-                        time.sleep(1)
-                        abs_response = requests.get(abs_url)
-                        
-                        # 使用BeautifulSoup库和Python内置的html.parser来解析返回的HTML文本。
-                        abs_soup = BeautifulSoup(abs_response.text, "html.parser")
-                        # HTML 示例: <blockquote class="mathjax">Selective spatial control of chemical reactions...</p>
-                        abstract_tag = abs_soup.find("blockquote", class_="abstract mathjax")
-                        abstract = (
-                            abstract_tag.text.strip().replace("Abstract:", "").strip() 
-                            if abstract_tag 
-                            else "No abstract available"
-                        )
-
-                        # 评论（如果有）位于 <dd> 标签内的一个 class="list-comments" 的 <div> 中。
-                        # HTML 示例: <div class="list-comments mathjax">10 pages, 5 figures</div>
-                        comments_tag = entries[i + 1].find("div", class_="list-comments")
-                        comments = (
-                            comments_tag.text.strip() if comments_tag else "No comments available"
-                        )
-
-                        paper_info = {
-                            "title": title,
-                            "arXiv_id": pdf_url.split("/")[-1],
-                            "abstract": abstract,
-                            "comments": comments,
-                            "pdf_url": pdf_url,
-                            "abstract_url": abs_url,
-                        }
-
-                        all_papers.append(paper_info)
+                # 逐条解析列表页，每篇论文只有在需要时才会被解析出来；
+                # 摘要需要单独请求摘要页，请求期间 parse 阶段会被暂停。
+                with profiler.stage("parse"):
+                    for entry in listing_entries(response):
+                        papers_on_this_page += 1
+
+                        # 交叉列表的论文在其他类别中已抓取过，直接复用，无需再次请求摘要页；
+                        # 常驻模式下缓存跨运行保留，列表中出现新版本或标题变化时重新抓取摘要
+                        paper_id = _entry_id(entry)
+                        paper = seen.get(paper_id)
+                        if paper is None or _revised(paper, entry):
+                            # 发送HTTP GET请求到摘要页，获取页面内容。
+                            polite_sleep(1)
+                            abs_response = _get(ARXIV_URL + entry["abs_url"], "fetch_abstract", category, labels)
+                            abstract = abstract_from_page(abs_response)
+                            paper = seen[paper_id] = _paper_info(entry, abstract, category)
+
+                        all_papers.append(paper)
                         if len(all_papers) >= max_results:
                             limit_reached = True
                             break
-                    if limit_reached:
-                        break
             except Exception as e:
                 break
             
             # If the limit is reached, or the page is empty, or it's the last page, exit the loop.
-            if limit_reached or papers_on_this_page == 0 or papers_on_this_page < (batch_size * 2):
+            if limit_reached or papers_on_this_page == 0 or papers_on_this_page < batch_size:
                 break
                 
             skip += batch_size
-            time.sleep(1)  # 避免请求过于频繁
+            polite_sleep(1)  # 避免请求过于频繁
         
         return all_papers[:max_results]
 
@@ -175,10 +241,10 @@ if __name__ == "__main__":
     print(f"获取的论文数量: {len(papers)}")
     for i, paper in enumerate(papers):
         print(f"\n--- 论文 {i+1} ---")
-        print(f"标题: {paper['title']}")
-        print(f"arXiv ID: {paper['arXiv_id']}")
-        print(f"摘要链接: {paper['abstract_url']}")
-        print(f"PDF 链接: {paper['pdf_url']}")
-        print(f"摘要: {paper['abstract']}")
-        print(f"评论: {paper['comments']}")
+        print(f"标题: {paper.title}")
+        print(f"arXiv ID: {paper.arxiv_id}")
+        print(f"摘要链接: {paper.abstract_url}")
+        print(f"PDF 链接: {paper.pdf_url}")
+        print(f"摘要: {paper.abstract}")
+        print(f"评论: {paper.comments}")
         print("-" * 20)
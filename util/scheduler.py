@@ -0,0 +1,253 @@
+"""
+Long-running service mode: each user's digest runs on its own cron schedule, arXiv listings are
+polled between runs, and the config file is re-read whenever it changes.
+"""
+
+import os
+import random
+import threading
+import time
+from datetime import datetime, timedelta
+
+from loguru import logger
+
+from util.config import config_path, get_config_value, load_config, server_chan_keys
+from util.delivery import delivery
+from util.executor import run_users
+from util.metrics import metrics
+from util.request import get_arxiv_papers_from_date, polite_sleep
+
+DEFAULT_SCHEDULE = "0 8 * * *"
+
+
+class Cron:
+    """
+    Standard 5-field cron expression: minute hour day-of-month month day-of-week.
+    Fields accept *, numbers, ranges (a-b), steps (*/n, a-b/n) and comma-separated lists; day-of-week
+    0 and 7 are Sunday.
+    """
+
+    RANGES = ((0, 59), (0, 23), (1, 31), (1, 12), (0, 7))
+
+    def __init__(self, expression: str):
+        fields = expression.split()
+        if len(fields) != 5:
+            raise ValueError(f"Invalid cron expression '{expression}': expected 5 fields.")
+        self.expression = expression
+        self.minutes, self.hours, self.days, self.months, weekdays = (
+            self._parse(field, low, high, expression) for field, (low, high) in zip(fields, self.RANGES)
+        )
+        self.weekdays = {day % 7 for day in weekdays}
+        # 与 cron 一致：日期与星期同时被限制时，满足其中之一即可
+        self.any_day = fields[2] == "*"
+        self.any_weekday = fields[4] == "*"
+
+    @staticmethod
+    def _parse(field: str, low: int, high: int, expression: str) -> set:
+        values = set()
+        for part in field.split(","):
+            step = 1
+            if "/" in part:
+                part, step = part.split("/")
+                step = int(step)
+            if part == "*":
+                start, end = low, high
+            elif "-" in part:
+                start, end = map(int, part.split("-"))
+            else:
+                start = int(part)
+                end = high if step > 1 else start
+            if not low <= start <= end <= high or step < 1:
+                raise ValueError(f"Invalid cron field '{field}' in '{expression}'.")
+            values.update(range(start, end + 1, step))
+        return values
+
+    def _day_matches(self, dt: datetime) -> bool:
+        day = dt.day in self.days
+        weekday = (dt.weekday() + 1) % 7 in self.weekdays
+        if self.any_day or self.any_weekday:
+            return day and weekday
+        return day or weekday
+
+    def matches(self, dt: datetime) -> bool:
+        return (
+            dt.minute in self.minutes
+            and dt.hour in self.hours
+            and dt.month in self.months
+            and self._day_matches(dt)
+        )
+
+    def next_after(self, dt: datetime):
+        """First matching minute strictly after `dt`, or None if there is none within a year."""
+        t = dt.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        limit = t + timedelta(days=366)
+        while t < limit:
+            if t.month not in self.months or not self._day_matches(t):
+                t = (t + timedelta(days=1)).replace(hour=0, minute=0)
+            elif t.hour not in self.hours:
+                t = (t + timedelta(hours=1)).replace(minute=0)
+            elif t.minute not in self.minutes:
+                t += timedelta(minutes=1)
+            else:
+                return t
+        return None
+
+
+class Daemon:
+    """
+    Keeps one process resident so HTTP sessions, LLM clients, the history database and the paper
+    cache stay warm between digests.
+
+    run_user(name, config, seen) runs the digest of one user; `seen` is the {arxiv_id: Paper} cache
+    that polling keeps up to date, so at send time only papers listed since the last poll need their
+    abstract fetched. configure(config) applies the process-wide settings after every (re)load.
+    """
+
+    def __init__(self, tool: str, run_user, configure=None):
+        self.tool = tool
+        self.run_user = run_user
+        self.configure = configure
+        self.config = None
+        self.path = None
+        self.mtime = None
+        self.schedules = {}
+        self.seen = {}
+        self.last_checked = None
+        self.next_poll = 0.0
+        self.day = None
+        self.stopping = threading.Event()
+
+    def stop(self):
+        self.stopping.set()
+
+    # -------------------------------------------------------------- config
+
+    def reload(self) -> bool:
+        """Re-read the config file if it changed; an invalid file keeps the previous config."""
+        path = config_path()
+        try:
+            mtime = os.stat(path).st_mtime_ns if path else None
+        except OSError:
+            mtime = None
+        if self.config is not None and (path, mtime) == (self.path, self.mtime):
+            return False
+        try:
+            config = load_config()
+            schedules = {
+                name: Cron(
+                    config.get(name, {}).get("schedule")
+                    or get_config_value(config, self.tool, "schedule", default=DEFAULT_SCHEDULE)
+                )
+                for name in config.get("names", [])
+            }
+        except Exception as e:
+            if self.config is None:
+                raise
+            # 记录本次的修改时间，文件再次修改之前不再重复报错
+            self.path, self.mtime = path, mtime
+            logger.error(f"Failed to reload {path}, keeping the previous config: {e}")
+            return False
+
+        self.config, self.schedules, self.path, self.mtime = config, schedules, path, mtime
+        if self.configure:
+            self.configure(config)
+        now = datetime.now()
+        for name, cron in schedules.items():
+            logger.info(f"Schedule of {name}: '{cron.expression}', next run at {cron.next_after(now)}")
+        return True
+
+    # ------------------------------------------------------------- polling
+
+    def poll(self):
+        """Fetch the listings of every configured category and cache new papers for the next digests."""
+        config = self.config
+        max_entries = get_config_value(config, None, "max_entries", default=100)
+        categories = sorted(
+            {category for name in config.get("names", []) for category in config.get(name, {}).get("categories", [])}
+        )
+        start = time.perf_counter()
+        known = len(self.seen)
+        listed = {}
+        for category in categories:
+            if self.stopping.is_set():
+                return
+            with metrics.timer("poll", category=category):
+                papers = get_arxiv_papers_from_date(category, max_entries, days="pastweek", seen=self.seen)
+            listed.update((paper.arxiv_id, paper) for paper in papers)
+            polite_sleep(random.randint(5, 15))
+        # 只保留仍出现在列表中的论文，缓存不会随运行时间无限增长
+        new = len(self.seen) - known
+        self.seen = listed
+        logger.info(
+            f"Polled {len(categories)} categories in {time.perf_counter() - start:.1f}s: "
+            f"{new} new papers, {len(listed)} cached."
+        )
+
+        sender = get_config_value(config, self.tool, "sender")
+        delivery.retry_outbox(
+            {sender: get_config_value(config, self.tool, "sender_password")}, server_chan_keys(config, self.tool)
+        )
+
+    # ----------------------------------------------------------- schedule
+
+    def due(self, now: datetime) -> list:
+        """Users whose schedule fired since the last check; missed minutes are caught up, at most one day."""
+        if self.last_checked is None:
+            t = now
+        else:
+            t = max(self.last_checked + timedelta(minutes=1), now - timedelta(days=1))
+        names = []
+        while t <= now:
+            for name, cron in self.schedules.items():
+                if name not in names and cron.matches(t):
+                    names.append(name)
+            t += timedelta(minutes=1)
+        self.last_checked = now
+        return names
+
+    def _metrics_dir(self) -> str:
+        save_dir = get_config_value(self.config, None, "save_dir", default="./arxiv_history")
+        return get_config_value(self.config, None, "metrics_dir", default=save_dir)
+
+    def _rotate_day(self, now: datetime):
+        # 每天的运行报告单独保存，常驻进程的指标不会无限累积
+        today = now.strftime("%Y-%m-%d")
+        if self.day is not None and today != self.day:
+            metrics.save(self._metrics_dir(), self.day)
+            metrics.reset()
+        self.day = today
+
+    def run_digests(self, names: list):
+        """Run the digests that are due concurrently; one user's failure does not affect the others."""
+        start = time.perf_counter()
+        max_workers = get_config_value(self.config, self.tool, "max_concurrent_users", default=4)
+        results = run_users(names, lambda name: self.run_user(name, self.config, self.seen), max_workers)
+        for name, result in results.items():
+            if result["error"]:
+                metrics.inc("daemon_run_failures_total", user=name)
+            else:
+                logger.info(f"Digest of {name} finished in {result['seconds']:.1f}s.")
+        logger.info(f"{len(names)} digests finished in {time.perf_counter() - start:.1f}s.")
+        metrics.save(self._metrics_dir(), self.day)
+
+    def run_forever(self):
+        self.reload()
+        logger.info(f"Daemon started with {len(self.schedules)} users, config {self.path}.")
+        while not self.stopping.is_set():
+            self.reload()
+            now = datetime.now().replace(second=0, microsecond=0)
+            self._rotate_day(now)
+            due = self.due(now)
+            if due and not self.stopping.is_set():
+                self.run_digests(due)
+
+            poll_interval = get_config_value(self.config, self.tool, "poll_interval", default=60)
+            if poll_interval and time.monotonic() >= self.next_poll and not self.stopping.is_set():
+                try:
+                    self.poll()
+                except Exception as e:
+                    logger.warning(f"Polling failed, keeping the cached papers: {e}")
+                self.next_poll = time.monotonic() + poll_interval * 60
+            # 每分钟检查一次调度
+            self.stopping.wait(60 - datetime.now().second)
+        logger.info("Daemon stopped.")
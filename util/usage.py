@@ -0,0 +1,92 @@
+"""
+Token, latency and cost accounting for LLM calls.
+"""
+
+import json
+import os
+import threading
+from collections import defaultdict
+
+
+class UsageTracker:
+    """
+    Records every LLM call of one run and aggregates it per user, category and stage.
+
+    prices: {model: {"prompt": float, "completion": float}}, in USD per 1M tokens.
+    """
+
+    def __init__(self, user: str = "", model: str = "", prices: dict = None):
+        self.user = user
+        self.model = model
+        self.prices = prices or {}
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def estimate_cost(self, prompt_tokens: int, completion_tokens: int) -> float:
+        price = self.prices.get(self.model, {})
+        return (
+            prompt_tokens * price.get("prompt", 0.0)
+            + completion_tokens * price.get("completion", 0.0)
+        ) / 1_000_000
+
+    def record(
+        self,
+        stage: str,
+        prompt_tokens: int,
+        completion_tokens: int,
+        latency: float,
+        retries: int = 0,
+        category: str = "",
+    ):
+        call = {
+            "user": self.user,
+            "model": self.model,
+            "category": category,
+            "stage": stage,
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "latency": latency,
+            "retries": retries,
+            "cost": self.estimate_cost(prompt_tokens, completion_tokens),
+        }
+        with self.lock:
+            self.calls.append(call)
+        return call
+
+    def _aggregate(self, key: str) -> dict:
+        groups = defaultdict(
+            lambda: {
+                "calls": 0,
+                "prompt_tokens": 0,
+                "completion_tokens": 0,
+                "latency": 0.0,
+                "retries": 0,
+                "cost": 0.0,
+            }
+        )
+        for call in self.calls:
+            group = groups[call[key]]
+            group["calls"] += 1
+            for field in ("prompt_tokens", "completion_tokens", "latency", "retries", "cost"):
+                group[field] += call[field]
+        return dict(groups)
+
+    def summary(self) -> dict:
+        with self.lock:
+            total = self._aggregate("user").get(self.user, {})
+            return {
+                "user": self.user,
+                "model": self.model,
+                "total": total,
+                "by_category": self._aggregate("category"),
+                "by_stage": self._aggregate("stage"),
+            }
+
+    def save(self, save_dir: str, date: str) -> str:
+        """Write the summary as usage-[<user>-]<date>.json into save_dir and return its path."""
+        os.makedirs(save_dir, exist_ok=True)
+        name = f"usage-{self.user}-{date}.json" if self.user else f"usage-{date}.json"
+        save_path = os.path.join(save_dir, name)
+        with open(save_path, "w", encoding="utf-8") as f:
+            json.dump(self.summary(), f, ensure_ascii=False, indent=2)
+        return save_path